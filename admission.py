@@ -0,0 +1,251 @@
+import collections
+import contextlib
+import functools
+import itertools
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+import profiling
+from cache import TTLCache
+
+RATE = 1.0  # скорость пополнения запросов пользователя, запросов в секунду
+BURST = 10  # максимальное количество запросов пользователя подряд (емкость "ведра")
+BUCKET_TTL = 3600  # время хранения "ведра" неактивного пользователя, сек.
+WORKER_THREADS = 8  # количество потоков обработки сообщений БОТа
+MAX_SEARCHES = 4  # максимальное количество одновременных поисков (остальные потоки - для диалогов)
+MAX_WAITING = 3  # максимальное количество поисков в очереди (чтобы ожидающие поиски не заняли все потоки)
+FAIR_WINDOW = 600  # период, за который считаются поиски пользователя для очередности, сек.
+
+
+class SearchCancelled(Exception):
+    """ Исключение отмены поиска (пользователь начал новый поиск). """
+
+
+class SearchRejected(Exception):
+    """ Исключение отказа в поиске (очередь поисков переполнена), текст - сообщение для пользователя. """
+
+
+class TokenBucket:
+    """
+    Класс ограничения частоты запросов ("ведро с жетонами").
+
+    "Ведро" вмещает burst жетонов и пополняется со скоростью rate жетонов в секунду. Каждый запрос забирает один
+    жетон, а если жетонов нет - запрос отклоняется. Поэтому короткие всплески до burst запросов проходят,
+    а средняя частота запросов не превышает rate.
+    """
+
+    def __init__(self, rate: float = RATE, burst: int = BURST) -> None:
+        """
+        :param rate: - скорость пополнения, жетонов в секунду
+        :param burst: - емкость "ведра", жетонов
+        :type rate: float
+        :type burst: int
+        """
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def take(self) -> bool:
+        """
+        Функция получения жетона.
+
+        :rtype: bool - True, если жетон получен (запрос разрешен)
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
+
+
+class Ticket:
+    """ Класс заявки на поиск одного пользователя. """
+
+    def __init__(self, user_id: int, number: int, priority: int) -> None:
+        """
+        :param user_id: - ID пользователя
+        :param number: - порядковый номер заявки (для очередности при равном приоритете)
+        :param priority: - приоритет (количество недавних поисков пользователя, меньше - раньше)
+        """
+        self.user_id = user_id
+        self.order = (priority, number)
+        self.cancelled = False
+        self.running = False
+        self.previous = None  # заменяемая заявка пользователя, которая еще выполняется
+
+
+class AdmissionControl:
+    """
+    Класс допуска поисков к выполнению.
+
+    У каждого пользователя не более одного поиска одновременно: новый поиск отменяет предыдущий (отмена проверяется
+    в точках checkpoint - перед запросом каждой страницы, выводом каждой гостиницы и итогового сообщения) и начинается
+    только после того, как предыдущий поиск остановится.
+    Одновременно выполняется не более MAX_SEARCHES поисков всех пользователей. Ожидающие поиски допускаются
+    по очереди, в которой пользователи с меньшим количеством поисков за FAIR_WINDOW сек. идут первыми, поэтому
+    пользователь, часто повторяющий поиск, не замедляет поиски остальных.
+    """
+
+    def __init__(self, max_searches: int = MAX_SEARCHES, max_waiting: int = MAX_WAITING) -> None:
+        """
+        :param max_searches: - максимальное количество одновременных поисков
+        :param max_waiting: - максимальное количество поисков в очереди
+        :type max_searches: int
+        :type max_waiting: int
+        """
+        self.__max_searches = max_searches
+        self.__max_waiting = max_waiting
+        self.__buckets = TTLCache(ttl=BUCKET_TTL, max_size=65536)  # в виде (ID пользователя: "ведро")
+        self.__active = {}  # текущие заявки в виде (ID пользователя: заявка)
+        self.__waiting = []  # ожидающие заявки
+        self.__running = 0
+        self.__history = collections.defaultdict(collections.deque)  # время поисков в виде (ID пользователя: [время])
+        self.__numbers = itertools.count()
+        self.__condition = threading.Condition()
+        self.__local = threading.local()  # заявка, выполняемая текущим потоком
+
+    def allow(self, user_id: int) -> bool:
+        """
+        Функция проверки частоты запросов пользователя (TokenBucket).
+
+        :param user_id: - ID пользователя
+        :type user_id: int
+        :rtype: bool - True, если запрос разрешен
+        """
+        bucket = self.__buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket()
+            self.__buckets.set(user_id, bucket)
+        return bucket.take()
+
+    @contextlib.contextmanager
+    def search(self, user_id: int) -> Iterator[Ticket]:
+        """
+        Контекстный менеджер выполнения поиска.
+
+        Отменяет предыдущий поиск пользователя и ждет своей очереди. Если поиск отменен во время ожидания, то возникает
+        исключение SearchCancelled, а если очередь переполнена - SearchRejected (поиск, заменяющий ожидающий поиск
+        пользователя, занимает его место в очереди и не отклоняется).
+
+        :param user_id: - ID пользователя
+        :type user_id: int
+        """
+        with profiling.phase('queue'):
+            ticket = self.__enter(user_id)
+        self.__local.ticket = ticket
+        try:
+            yield ticket
+        finally:
+            self.__local.ticket = None
+            with self.__condition:
+                self.__running -= 1
+                ticket.running = False
+                if self.__active.get(user_id) is ticket:
+                    del self.__active[user_id]
+                self.__condition.notify_all()
+
+    def checkpoint(self) -> None:
+        """ Функция проверки отмены поиска текущего потока (возникает исключение SearchCancelled). """
+        ticket = getattr(self.__local, 'ticket', None)
+        if ticket is not None and ticket.cancelled:
+            raise SearchCancelled()
+
+    def bind(self, func: Callable) -> Callable:
+        """
+        Функция передачи заявки текущего потока в функцию, выполняемую другим потоком (н-р: ThreadPoolExecutor),
+        чтобы checkpoint в этом потоке тоже останавливал отмененный поиск.
+
+        :param func: - функция, выполняемая другим потоком
+        :type func: Callable
+        :rtype: Callable
+        """
+        ticket = getattr(self.__local, 'ticket', None)
+        if ticket is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapped_func(*args, **kwargs) -> Any:
+            self.__local.ticket = ticket
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.__local.ticket = None
+
+        return wrapped_func
+
+    def __enter(self, user_id: int) -> Ticket:
+        """ Функция регистрации заявки и ожидания её очереди. """
+        with self.__condition:
+            previous = self.__active.get(user_id)
+            if previous is not None:
+                previous.cancelled = True
+            # заявка, заменяющая ожидающую, занимает её место в очереди, а остальные учитываются в ограничении очереди
+            if ((previous is None or previous.running) and len(self.__waiting) >= self.__max_waiting and
+                    self.__running >= self.__max_searches):
+                raise SearchRejected('Сейчас слишком много поисков, попробуйте через минуту.')
+
+            history = self.__history[user_id]
+            now = time.monotonic()
+            while history and history[0] < now - FAIR_WINDOW:
+                history.popleft()
+            history.append(now)
+            ticket = Ticket(user_id, next(self.__numbers), len(history))
+            if previous is not None:  # ожидающая заявка передает новой свою заменяемую заявку
+                ticket.previous = previous if previous.running else previous.previous
+            self.__active[user_id] = ticket
+            self.__waiting.append(ticket)
+            self.__condition.notify_all()
+
+            while not ticket.cancelled and not self.__is_next(ticket):
+                self.__condition.wait()
+            self.__waiting.remove(ticket)
+            ticket.previous = None
+            self.__condition.notify_all()
+            if ticket.cancelled:
+                if self.__active.get(user_id) is ticket:
+                    del self.__active[user_id]
+                raise SearchCancelled()
+            self.__running += 1
+            ticket.running = True
+            for stale in [key for key, times in self.__history.items() if not times or times[-1] < now - FAIR_WINDOW]:
+                del self.__history[stale]
+            return ticket
+
+    def __is_next(self, ticket: Ticket) -> bool:
+        """
+        Функция проверки, что заявка может начать выполнение: есть свободное место, и она первая в очереди среди заявок,
+        предыдущий поиск пользователя которых уже остановился (такие заявки не задерживают остальные).
+        """
+        if self.__running >= self.__max_searches:
+            return False
+        ready = [item for item in self.__waiting if item.previous is None or not item.previous.running]
+        return bool(ready) and min(ready, key=lambda item: item.order) is ticket
+
+
+controller = AdmissionControl()
+
+
+def checkpoint() -> None:
+    """ Функция проверки отмены поиска текущего потока (см. AdmissionControl.checkpoint). """
+
+    controller.checkpoint()
+
+
+def bind(func: Callable) -> Callable:
+    """
+    Функция передачи поиска текущего потока (заявки и разбивки по этапам) в функцию, выполняемую другим потоком
+    (см. AdmissionControl.bind и profiling.bind).
+
+    :param func: - функция, выполняемая другим потоком
+    :type func: Callable
+    :rtype: Callable
+    """
+
+    return controller.bind(profiling.bind(func))
+
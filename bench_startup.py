@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Замер времени запуска БОТа (без сетевых запросов).
+
+Каждый замер выполняется в новом процессе Python: измеряется время импорта модуля main и время создания БОТа
+фабрикой main.create_bot (с тестовым токеном и временными базами истории поиска и подписок).
+
+Запуск из корневой папки проекта:
+    python bench_startup.py [количество замеров]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_bot('0:benchmark', 'benchmark', history_db=sys.argv[1], cities_file=sys.argv[2], watch_db=sys.argv[3])
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_bot': created - imported}))
+"""
+
+
+def measure_once(directory: str) -> dict:
+    """ Функция одного замера в новом процессе. """
+    output = subprocess.run([sys.executable, '-c', MEASURE, os.path.join(directory, 'history.sqlite3'),
+                             os.path.join(directory, 'cities.json'), os.path.join(directory, 'watch.sqlite3')],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        measure_once(directory)  # прогрев (создание .pyc файлов и базы истории)
+        for _ in range(runs):
+            results.append(measure_once(directory))
+
+    for key in ('import', 'create_bot'):
+        values = [result[key] * 1000 for result in results]
+        print(f"{key:>10}: медиана {statistics.median(values):7.1f} мс, "
+              f"мин. {min(values):7.1f} мс, макс. {max(values):7.1f} мс")
+    total = [(result['import'] + result['create_bot']) * 1000 for result in results]
+    print(f"{'всего':>10}: медиана {statistics.median(total):7.1f} мс ({runs} замеров)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
 import json
 import re
-import time
 import requests
-from typing import Dict
-from settings import API_KEY
+from typing import Dict, List, Tuple
+import config
+import currency
+import dates
+import profiling
+from cache import TTLCache
+
+PAGE_SIZE = 25  # количество гостиниц на странице API запроса (максимум 25)
+PAGES_TTL = 15 * 60  # время жизни страницы гостиниц в кэше, сек.
+
+pages_cache = TTLCache(ttl=PAGES_TTL, max_size=1024)  # кэш в виде (параметры API запроса: страница)
 
 
 class Hotels:
@@ -20,13 +28,13 @@ class Hotels:
         """
         return self.__hotels_dict
 
-    def set_item(self, arg, value) -> None:
+    def set_item(self, arg, value: Dict) -> None:
         """ Сеттер для записи данных найденного отеля.
 
         :param arg - ключ (название отеля)
-        :param value - значение (информация об отеле)
+        :param value - значение (ID отеля и информация об отеле)
         :type arg: str
-        :type value: str
+        :type value: Dict
         """
         self.__hotels_dict[arg] = value
 
@@ -36,24 +44,21 @@ class Hotels:
 
 
 def get_hotels_dict(destination_id: int = 0, min_price: int = 0, max_price: int = 0, min_distance: int = 0,
-                    max_distance: int = 0, limit: int = 0, page_number: int = 1) -> Dict:
+                    max_distance: int = 0, limit: int = 0, page_number: int = 1, check_in: str = '',
+                    check_out: str = '') -> Dict:
     """
     Функция получения словаря гостиниц.
 
     Принимает на вход ID города и максимальное количество искомых гостиниц.
     Если это первый запрос (page_number: int = 1), то осуществляется очистка словаря гостиниц.
-    Отправляет API запрос на хост "hotels4.p.rapidapi.com" и преобразует полученные данные в json словарь "data".
-
-    Затем, определяется, если хоть какая-то полезная информация по осуществленному запросу.
-    Если ошибки не выявлено (значение ключа "result" не равно "ERROR"), то преобразует полученные данные в словарь
-    в виде (название: стоимость и расстояние от центра города).
+    Получает гостиницы постранично (get_hotels_page) в виде (название: ID, стоимость и расстояние от центра города).
     При этом, если в полученных данных, у какой-либо гостиницы, отсутствуют данные о стоимости, то её стоимости
     присваивается значение бесконечности (float("inf")).
     В словарь заносятся только те гостиницы, чья стоимость и дистанция в пределах указанных минимум и максимумов.
 
     Количество гостиниц в словаре ограничено переменной "limit". при этом:
-    Если стоимость и дистанция (оба) превысят указанные максимумы, то выставляется флаг "finish" завершения поиска.
-    Иначе, текущая функция зацикливается с повышением номера запрашиваемой страницы (page_number += 1).
+    Если дистанция превысит указанный максимум (или страницы закончатся), то выставляется флаг "finish" завершения
+    поиска. Иначе, текущая функция зацикливается с повышением номера запрашиваемой страницы (page_number += 1).
 
     :param destination_id: - значение ID города
     :param min_price: - значение минимальной стоимости гостиницы
@@ -62,76 +67,118 @@ def get_hotels_dict(destination_id: int = 0, min_price: int = 0, max_price: int
     :param max_distance: - значение максимальной дистанции от центра города
     :param limit: - значение максимального количества выводимых гостиниц
     :param page_number: - значение номера запрашиваемой страницы
+    :param check_in: - дата заезда (гггг-мм-дд), по умолчанию - сегодняшняя дата
+    :param check_out: - дата выезда (гггг-мм-дд), по умолчанию - завтрашняя дата
     :type: int
     """
 
-    days_count = 1
-    time_add = days_count * 86400
-    time_check_in = time.strftime("%Y-%m-%d", time.localtime())
-    time_check_out_secs = time.mktime(time.localtime()) + time_add
-    time_check_out = time.strftime("%Y-%m-%d", time.localtime(time_check_out_secs))
+    if not check_in or not check_out:
+        check_in, check_out = dates.get_stay_dates()
 
     hotels = Hotels()
-    finish = False
-    prev_hotel, last_hotel = '', ''
-    while len(hotels.get_dict()) < limit and not finish:
-        # print('page_number', page_number)
-        url = "https://hotels4.p.rapidapi.com/properties/list"
-        querystring = {"adults1": "1",
-                       "pageNumber": page_number,  # номер страницы с которой осуществляется запрос данных.
-                       "destinationId": destination_id,  # ID города.
-                       "pageSize": "25",  # количество выдаваемых значений при запросе с сайта (максимум 25).
-                       "checkOut": time_check_out,  # время выезда.
-                       "checkIn": time_check_in,  # время заселения.
-                       "priceMax": max_price,
-                       "sortOrder": "DISTANCE_FROM_LANDMARK",  # отвечает за сортировку (ДИСТАНЦИЯ).
-                       "locale": "ru_RU",  # отвечает за язык вывода гостиниц и единиц измерения расстояния (н-р: км.).
-                       "currency": "RUB",  # отвечает за конвертацию стоимости в конкретную валюту (н-р: RUB).
-                       "priceMin": min_price,
-                       "landmarkIds": "City center"
-                       }
-
-        headers = {
-            'x-rapidapi-key': API_KEY,
-            'x-rapidapi-host': "hotels4.p.rapidapi.com"
-        }
+    while len(hotels.get_dict()) < limit:
+        records, finish = get_hotels_page(destination_id, min_price, max_price, min_distance, max_distance,
+                                          page_number, check_in, check_out)
+        for name, record in records:
+            if len(hotels.get_dict()) < limit:
+                hotels.set_item(name, record)
+            else:
+                break
+        if finish:
+            break
+        page_number += 1
 
+    return hotels.get_dict()
+
+
+def get_hotels_page(destination_id: int = 0, min_price: int = 0, max_price: int = 0, min_distance: int = 0,
+                    max_distance: int = 0, page_number: int = 1, check_in: str = '',
+                    check_out: str = '') -> Tuple[List[Tuple[str, Dict]], bool]:
+    """
+    Функция получения одной страницы гостиниц.
+
+    Отправляет API запрос на хост "hotels4.p.rapidapi.com" и преобразует полученные данные в json словарь "data".
+    Если ошибки не выявлено (значение ключа "result" не равно "ERROR"), то преобразует полученные данные в список
+    в виде [(название, ID, стоимость числом, адрес, расстояние от центра города и координаты), ...].
+    В список заносятся только те гостиницы, чья дистанция в пределах указанных минимума и максимума.
+    Если дистанция превысит указанный максимум (гостиницы отсортированы по дистанции), или страница последняя, то
+    выставляется флаг "finish" завершения поиска.
+    Страница сначала ищется в кэше (pages_cache). Цены запрашиваются и кэшируются только в базовой валюте
+    (currency.BASE_CURRENCY) и переводятся в валюту пользователя при выводе, поэтому валюта в ключ кэша не входит.
+    Запрос и разбор страницы записываются в разбивку медленного поиска как отдельные этапы (profiling.phase).
+
+    :param destination_id: - значение ID города
+    :param min_price: - значение минимальной стоимости гостиницы (в базовой валюте)
+    :param max_price: - значение максимальной стоимости гостиницы (в базовой валюте)
+    :param min_distance: - значение минимальной дистанции от центра города
+    :param max_distance: - значение максимальной дистанции от центра города
+    :param page_number: - значение номера запрашиваемой страницы
+    :param check_in: - дата заезда (гггг-мм-дд), по умолчанию - сегодняшняя дата
+    :param check_out: - дата выезда (гггг-мм-дд), по умолчанию - завтрашняя дата
+    :rtype: Tuple[List[Tuple[str, Dict]], bool] - (список гостиниц, флаг "finish")
+    """
+
+    if not check_in or not check_out:
+        check_in, check_out = dates.get_stay_dates()
+
+    key = (str(destination_id), min_price, max_price, min_distance, max_distance, page_number, check_in, check_out,
+           config.LOCALE)
+    page = pages_cache.get(key)
+    if page is not None:
+        return page
+
+    url = "https://hotels4.p.rapidapi.com/properties/list"
+    querystring = {"adults1": "1",
+                   "pageNumber": page_number,  # номер страницы с которой осуществляется запрос данных.
+                   "destinationId": destination_id,  # ID города.
+                   "pageSize": PAGE_SIZE,  # количество выдаваемых значений при запросе с сайта (максимум 25).
+                   "checkOut": check_out,  # время выезда.
+                   "checkIn": check_in,  # время заселения.
+                   "priceMax": max_price,
+                   "sortOrder": "DISTANCE_FROM_LANDMARK",  # отвечает за сортировку (ДИСТАНЦИЯ).
+                   "locale": config.LOCALE,  # отвечает за язык вывода гостиниц и единиц измерения расстояния.
+                   "currency": currency.BASE_CURRENCY,  # цены всегда в базовой валюте (перевод - при выводе).
+                   "priceMin": min_price,
+                   "landmarkIds": "City center"
+                   }
+
+    headers = {
+        'x-rapidapi-key': config.API_KEY,
+        'x-rapidapi-host': "hotels4.p.rapidapi.com"
+    }
+
+    with profiling.phase(f"fetch page {page_number}"):
         response = requests.request("GET", url, headers=headers, params=querystring)
+    with profiling.phase(f"parse page {page_number}"):
         data = json.loads(response.text)
 
-        if data['result'] != 'ERROR':
-            for elem in data['data']['body']['searchResults']['results']:
-                # print(elem)
-                try:
-                    price = float(elem['ratePlan']['price']['exactCurrent'])
-                except KeyError:
-                    price = float("inf")
-                distance = re.sub(r"\s\w+", '', elem['landmarks'][0]['distance'])
-                distance = float(re.sub(r",", '.', distance))
-                # print(f"{elem['name']}\n{price}\n"
-                #       f"{elem['landmarks'][0]['distance']}\n")
-
-                if len(hotels.get_dict()) < limit:
-                    if min_distance <= distance <= max_distance:
-                        text = f"Стоимость: {elem['ratePlan']['price']['current']} \n" \
-                               f"Адрес: {elem['address']['streetAddress']} \n" \
-                               f"Расстояние от центра города: {elem['landmarks'][0]['distance']}"
-                        hotels.set_item(elem['name'], text)
-                        last_hotel = elem['name']
-                        # print(f"{elem['name']}\n{text}")
-                    elif distance > max_distance:
-                        finish = True
-                        break
-                else:
-                    break
-
-        if prev_hotel == last_hotel:
-            break
-        else:
-            prev_hotel = last_hotel
-            page_number += 1
-
-    return hotels.get_dict()
+        if data['result'] == 'ERROR':
+            return [], True
+
+        records = []
+        results = data['data']['body']['searchResults']['results']
+        for elem in results:
+            try:
+                price = float(elem['ratePlan']['price']['exactCurrent'])
+            except KeyError:
+                price = float("inf")
+            distance = re.sub(r"\s\w+", '', elem['landmarks'][0]['distance'])
+            distance = float(re.sub(r",", '.', distance))
+
+            if min_distance <= distance <= max_distance:
+                text = f"Адрес: {elem['address']['streetAddress']} \n" \
+                       f"Расстояние от центра города: {elem['landmarks'][0]['distance']}"
+                coordinate = elem.get('coordinate')  # координаты гостиницы (для поиска гостиниц рядом)
+                if coordinate:
+                    coordinate = (coordinate['lat'], coordinate['lon'])
+                records.append((elem['name'], {'id': elem['id'], 'text': text, 'price': price,
+                                               'coordinate': coordinate}))
+            elif distance > max_distance:
+                return records, True
+
+        page = records, len(results) < PAGE_SIZE
+    pages_cache.set(key, page)
+    return page
 
 
 if __name__ == "__main__":
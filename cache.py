@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """ Класс потокобезопасного кэша с ограниченным временем жизни (TTL) записей. """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 1024) -> None:
+        """
+        :param ttl: - время жизни записи, сек.
+        :param max_size: - максимальное количество записей в кэше
+        :type ttl: float
+        :type max_size: int
+        """
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__items = {}  # словарь для хранения записей в виде (ключ: (время устаревания, значение))
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Геттер для получения записи из кэша.
+
+        Если записи нет, или её время жизни истекло, то возвращается значение по умолчанию (default).
+
+        :param key: - ключ записи
+        :param default: - значение по умолчанию
+        :rtype [Any]
+        """
+        with self.__lock:
+            item = self.__items.get(key, None)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self.__items[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Сеттер для записи значения в кэш.
+
+        Если кэш заполнен, то сначала удаляются устаревшие записи, а если их нет - самая старая запись.
+
+        :param key: - ключ записи
+        :param value: - значение записи
+        :type value: [Any]
+        """
+        with self.__lock:
+            if key not in self.__items and len(self.__items) >= self.__max_size:
+                self.__evict()
+            self.__items[key] = (time.monotonic() + self.__ttl, value)
+
+    def delete(self, key: Hashable) -> None:
+        """ Функция удаляет запись из кэша. """
+        with self.__lock:
+            self.__items.pop(key, None)
+
+    def clear(self) -> None:
+        """ Функция очищает кэш. """
+        with self.__lock:
+            self.__items.clear()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, None) is not None
+
+    def __evict(self) -> None:
+        """ Функция удаляет устаревшие записи, а если таких нет - самую старую запись (вызывается под блокировкой). """
+        now = time.monotonic()
+        expired = [key for key, (expires, _) in self.__items.items() if expires < now]
+        for key in expired:
+            del self.__items[key]
+        if len(self.__items) >= self.__max_size:
+            del self.__items[next(iter(self.__items))]
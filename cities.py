@@ -0,0 +1,221 @@
+import bisect
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import requests
+
+from cache import TTLCache
+import config
+import profiling
+
+CITIES_FILE = 'cities.json'  # необязательный файл с заранее известными городами: [{"caption", "destinationId"}, ...]
+SEARCH_TTL = 24 * 3600  # время жизни результата поиска города в кэше, сек.
+DEBOUNCE_DELAY = 0.4  # задержка API запроса при наборе названия города в inline-режиме, сек.
+MIN_QUERY_LENGTH = 3  # минимальная длина названия города для API запроса в inline-режиме
+MAX_RESULTS = 20  # максимальное количество городов в ответе inline-режима
+
+search_cache = TTLCache(ttl=SEARCH_TTL, max_size=8192)  # кэш в виде ((язык, название города): список городов)
+
+
+def normalize(text: str) -> str:
+    """
+    Функция приведения названия города к виду для поиска (нижний регистр, "ё" заменяется на "е").
+
+    :param text: - название города
+    :type text: str
+    :rtype: str
+    """
+
+    return ' '.join(str(text).lower().replace('ё', 'е').split())
+
+
+class CityIndex:
+    """
+    Класс префиксного индекса городов.
+
+    Хранит города в отсортированном по нормализованному названию массиве, поэтому поиск городов по началу названия
+    осуществляется двоичным поиском (bisect) за O(log n) и не требует API запросов.
+    """
+
+    def __init__(self) -> None:
+        self.__keys = []  # отсортированный список нормализованных названий
+        self.__items = []  # список городов в виде {'caption': название, 'destinationId': ID}, в порядке __keys
+        self.__ids = {}  # словарь в виде (ID города: нормализованное название)
+        self.__lock = threading.Lock()
+
+    def add(self, destination_id: str, caption: str) -> None:
+        """
+        Сеттер для добавления города в индекс (повторное добавление города с тем же ID игнорируется).
+
+        :param destination_id: - ID города
+        :param caption: - название города
+        :type destination_id: str
+        :type caption: str
+        """
+        key = normalize(caption)
+        with self.__lock:
+            if str(destination_id) in self.__ids:
+                return
+            index = bisect.bisect_right(self.__keys, key)
+            self.__keys.insert(index, key)
+            self.__items.insert(index, {'caption': caption, 'destinationId': str(destination_id)})
+            self.__ids[str(destination_id)] = key
+
+    def search(self, prefix: str, limit: int = MAX_RESULTS) -> List[Dict]:
+        """
+        Геттер для получения городов, название которых начинается с переданной строки.
+
+        :param prefix: - начало названия города
+        :param limit: - максимальное количество городов
+        :type prefix: str
+        :type limit: int
+        :rtype: List[Dict] - список городов в виде {'caption': название, 'destinationId': ID}
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.__lock:
+            index = bisect.bisect_left(self.__keys, prefix)
+            found = []
+            while index < len(self.__keys) and len(found) < limit and self.__keys[index].startswith(prefix):
+                found.append(self.__items[index])
+                index += 1
+            return found
+
+    def get_exact(self, caption: str) -> Optional[Dict]:
+        """
+        Геттер для получения города по точному названию (н-р: по тексту, отправленному из inline-режима).
+
+        :param caption: - название города
+        :type caption: str
+        :rtype: Optional[Dict]
+        """
+        key = normalize(caption)
+        with self.__lock:
+            index = bisect.bisect_left(self.__keys, key)
+            if index < len(self.__keys) and self.__keys[index] == key:
+                return self.__items[index]
+        return None
+
+    def load(self, path: str = CITIES_FILE) -> None:
+        """
+        Функция загрузки заранее известных городов из файла (если он существует).
+
+        :param path: - путь к файлу в формате JSON: [{"caption": название, "destinationId": ID}, ...]
+        :type path: str
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as file:
+            for elem in json.load(file):
+                self.add(elem['destinationId'], elem['caption'])
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+
+class Debouncer:
+    """
+    Класс отложенного вызова функций.
+
+    Повторный вызов с тем же ключом (н-р: ID пользователя) до истечения задержки отменяет предыдущий, поэтому при
+    наборе текста API запрос отправляется только после паузы в наборе.
+    """
+
+    def __init__(self, delay: float = DEBOUNCE_DELAY) -> None:
+        """
+        :param delay: - задержка вызова, сек.
+        :type delay: float
+        """
+        self.__delay = delay
+        self.__timers = {}  # словарь в виде (ключ: таймер отложенного вызова)
+        self.__lock = threading.Lock()
+
+    def call(self, key: Hashable, func: Callable, *args: Any) -> None:
+        """
+        Функция отложенного вызова функции func(*args).
+
+        :param key: - ключ (н-р: ID пользователя)
+        :param func: - вызываемая функция
+        """
+        def run() -> None:
+            with self.__lock:
+                if self.__timers.get(key) is timer:
+                    del self.__timers[key]
+            func(*args)
+
+        with self.__lock:
+            previous = self.__timers.get(key, None)
+            if previous:
+                previous.cancel()
+            timer = threading.Timer(self.__delay, run)
+            timer.daemon = True
+            self.__timers[key] = timer
+            timer.start()
+
+
+def parse_cities(data: Dict) -> List[Dict]:
+    """
+    Функция получения списка городов из ответа API запроса "/locations/search".
+
+    В полученном словаре ищет элементы, соответствующие группе 'CITY_GROUP' ('group': 'CITY_GROUP'), а в нем элементы,
+    соответствующие типу 'CITY' ('type': 'CITY'). Из названия города удаляются HTML теги.
+
+    :param data: - ответ API запроса
+    :type data: Dict
+    :rtype: List[Dict] - список городов в виде {'caption': название, 'destinationId': ID}
+    """
+
+    found = []
+    for elem in data['suggestions']:
+        if elem['group'] == 'CITY_GROUP':
+            for i_elem in elem['entities']:
+                if i_elem['type'] == 'CITY':
+                    current_city = re.sub(r"<[^>]*>", '', i_elem['caption'])  # только теги, без их текста
+                    found.append({'caption': current_city, 'destinationId': i_elem['destinationId']})
+    return found
+
+
+def search_cities(query: str) -> Optional[List[Dict]]:
+    """
+    Функция поиска городов по названию.
+
+    Сначала ищет результат в кэше (search_cache). Если его там нет, то отправляет API запрос на хост
+    "hotels4.p.rapidapi.com", сохраняет результат в кэш и добавляет найденные города в префиксный индекс (city_index).
+    При ошибке получения данных возвращается None (и он не кэшируется).
+
+    :param query: - название города
+    :type query: str
+    :rtype: Optional[List[Dict]] - список городов в виде {'caption': название, 'destinationId': ID}
+    """
+
+    key = (config.LOCALE, normalize(query))
+    found = search_cache.get(key)
+    if found is not None:
+        return found
+
+    url = "https://hotels4.p.rapidapi.com/locations/search"
+    querystring = {"query": query, "locale": config.LOCALE}
+    headers = {
+        'x-rapidapi-key': config.API_KEY,
+        'x-rapidapi-host': "hotels4.p.rapidapi.com"
+    }
+    try:
+        with profiling.phase('city lookup'):
+            response = requests.request("GET", url, headers=headers, params=querystring)
+            data = json.loads(response.text)
+            found = parse_cities(data)
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as error_search:
+        print('search_cities error: ', error_search)
+        return None
+
+    search_cache.set(key, found)
+    for city in found:
+        city_index.add(city['destinationId'], city['caption'])
+    return found
+
+
+city_index = CityIndex()  # заполняется результатами поиска и файлом CITIES_FILE (см. CityIndex.load)
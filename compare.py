@@ -0,0 +1,129 @@
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import admission
+import cities
+import currency
+import lowprice
+
+MAX_CITIES = 3  # максимальное количество сравниваемых городов
+COMPARE_LIMIT = 25  # количество самых дешевых гостиниц, по которым строится распределение цен в городе
+
+
+def split_cities(text: str) -> List[str]:
+    """
+    Функция получения списка названий городов из сообщения.
+
+    Названия разделяются точкой с запятой или переводом строки (запятая может быть частью названия,
+    н-р: "Москва, Россия"). Повторы удаляются.
+
+    :param text: - сообщение с названиями городов
+    :type text: str
+    :rtype: List[str]
+    """
+
+    names = [name.strip() for name in str(text).replace('\n', ';').split(';')]
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def compare_city(name: str, limit: int = COMPARE_LIMIT) -> Dict:
+    """
+    Функция получения сводки цен по одному городу.
+
+    Находит город (cities.search_cities, берется первый найденный) и его самые дешевые гостиницы
+    (lowprice.get_hotels_dict), затем считает распределение их цен.
+
+    :param name: - название города
+    :param limit: - количество гостиниц для распределения цен
+    :type name: str
+    :type limit: int
+    :rtype: Dict - в виде {'name', 'caption', 'error', 'count', 'cheapest', 'prices': (min, Q1, медиана, Q3, max)}
+    """
+
+    summary = {'name': name, 'caption': name, 'error': '', 'count': 0, 'cheapest': None, 'prices': None}
+    admission.checkpoint()
+    found = cities.search_cities(name)
+    if found is None:
+        summary['error'] = 'Сбой в получении данных с сервера.'
+        return summary
+    if not found:
+        summary['error'] = 'Город не найден.'
+        return summary
+    summary['caption'] = found[0]['caption']
+
+    admission.checkpoint()
+    try:
+        hotels_dict = lowprice.get_hotels_dict(found[0]['destinationId'], limit)
+    except Exception as error_compare:
+        print('compare_city error: ', error_compare)
+        summary['error'] = 'Сбой в получении данных с сервера.'
+        return summary
+
+    prices = sorted((hotel['price'], hotel_name) for hotel_name, hotel in hotels_dict.items()
+                    if hotel['price'] != float('inf'))
+    summary['count'] = len(prices)
+    if prices:
+        values = [price for price, _ in prices]
+        summary['cheapest'] = (prices[0][1], prices[0][0])
+        if len(values) > 1:
+            first_quartile, median, third_quartile = statistics.quantiles(values, n=4, method='inclusive')
+        else:
+            first_quartile = median = third_quartile = values[0]
+        summary['prices'] = (values[0], first_quartile, median, third_quartile, values[-1])
+    return summary
+
+
+def compare_cities(names: List[str], limit: int = COMPARE_LIMIT) -> List[Dict]:
+    """
+    Функция одновременного получения сводок цен по нескольким городам.
+
+    Поиск по каждому городу (поиск города и поиск гостиниц) выполняется в отдельном потоке, поэтому общее время
+    сравнения близко к времени поиска по самому "медленному" городу.
+
+    :param names: - список названий городов
+    :param limit: - количество гостиниц для распределения цен
+    :type names: List[str]
+    :type limit: int
+    :rtype: List[Dict] - список сводок (см. compare_city) в порядке названий городов
+    """
+
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        return list(executor.map(admission.bind(lambda name: compare_city(name, limit)), names))
+
+
+def format_comparison(summaries: List[Dict], code: str = currency.BASE_CURRENCY) -> str:
+    """
+    Функция форматирования сравнения городов для вывода пользователю.
+
+    :param summaries: - список сводок цен по городам (см. compare_city)
+    :param code: - код валюты вывода цен (цены в сводках - в базовой валюте)
+    :type summaries: List[Dict]
+    :type code: str
+    :rtype: str
+    """
+
+    lines = []
+    for summary in summaries:
+        lines.append(f"{summary['caption']}:")
+        if summary['error']:
+            lines.append(f"  {summary['error']}")
+        elif not summary['prices']:
+            lines.append('  Гостиниц с известной стоимостью не найдено.')
+        else:
+            lowest, first_quartile, median, third_quartile, highest = (currency.from_base(price, code)
+                                                                       for price in summary['prices'])
+            lines.append(f"  Самая дешевая: {summary['cheapest'][0]} - "
+                         f"{currency.format_price(summary['cheapest'][1], code)}")
+            lines.append(f"  Цены {summary['count']} самых дешевых гостиниц, {currency.CURRENCIES[code]}:")
+            lines.append(f"  мин. {lowest:.0f} | 25% {first_quartile:.0f} | медиана {median:.0f} | "
+                         f"75% {third_quartile:.0f} | макс. {highest:.0f}")
+        lines.append('')
+
+    priced = [summary for summary in summaries if summary['prices']]
+    if len(priced) > 1:
+        best = min(priced, key=lambda summary: summary['prices'][2])
+        lines.append(f"Дешевле всего (по медиане цен): {best['caption']}")
+    return '\n'.join(lines).strip()
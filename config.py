@@ -0,0 +1,44 @@
+from typing import Dict, Iterable
+
+# Настройки БОТа. Задаются явно функцией configure (н-р: из файла settings.py функцией load_settings),
+# поэтому модули БОТа можно импортировать без файла settings.py (н-р: для тестов и замеров производительности).
+BOT_TOKEN = ''  # токен Телеграм-БОТа
+API_KEY = ''  # API-ключ сайта "hotels4.p.rapidapi.com"
+# Язык API запросов (названия городов и гостиниц, адреса). Диалоги БОТа только на русском, поэтому язык один.
+# Язык входит в ключи кэшей целиком: API возвращает названия и цены одной страницей, поэтому второй язык
+# запрашивал бы страницы гостиниц заново (вместе с ценами и координатами), а не только свои тексты.
+LOCALE = 'ru_RU'
+ADMIN_IDS = frozenset()  # ID пользователей Телеграм, которым доступны команды администратора (/profile, /slow)
+
+
+def configure(bot_token: str = '', api_key: str = '', admin_ids: Iterable[int] = ()) -> None:
+    """
+    Функция записи настроек БОТа.
+
+    :param bot_token: - токен Телеграм-БОТа
+    :param api_key: - API-ключ сайта "hotels4.p.rapidapi.com"
+    :param admin_ids: - ID администраторов БОТа
+    :type bot_token: str
+    :type api_key: str
+    :type admin_ids: Iterable[int]
+    """
+
+    global BOT_TOKEN, API_KEY, ADMIN_IDS
+    BOT_TOKEN = bot_token
+    API_KEY = api_key
+    ADMIN_IDS = frozenset(admin_ids)
+
+
+def load_settings() -> Dict:
+    """
+    Функция чтения настроек БОТа из файла settings.py.
+
+    Если файла (или нужных переменных в нём) нет, то возникает исключение ImportError.
+    Список администраторов (ADMIN_IDS) указывать необязательно.
+
+    :rtype: Dict - в виде {'bot_token': токен, 'api_key': API-ключ, 'admin_ids': ID администраторов}
+    """
+
+    import settings
+    from settings import BOT_TOKEN as bot_token, API_KEY as api_key
+    return {'bot_token': bot_token, 'api_key': api_key, 'admin_ids': tuple(getattr(settings, 'ADMIN_IDS', ()))}
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from typing import Dict
+
+import requests
+
+BASE_CURRENCY = 'RUB'  # валюта API запросов и кэша гостиниц (все цены хранятся в ней)
+RATES_URL = 'https://www.cbr-xml-daily.ru/daily_json.js'  # курсы валют ЦБ РФ (рублей за единицу валюты)
+RATES_TTL = 6 * 3600  # периодичность обновления таблицы курсов, сек.
+RETRY_DELAY = 300  # задержка повторного запроса курсов после сбоя, сек.
+
+# поддерживаемые валюты в виде (код валюты: обозначение)
+CURRENCIES = {'RUB': 'руб.', 'USD': '$', 'EUR': '€', 'GBP': '£', 'CNY': '¥', 'TRY': '₺', 'KZT': '₸'}
+
+
+class RateTable:
+    """
+    Класс таблицы курсов валют относительно базовой валюты (BASE_CURRENCY).
+
+    Таблица запрашивается одним API запросом для всех валют и пользователей и обновляется не чаще, чем раз
+    в RATES_TTL сек. Обновляет таблицу только один поток, остальные в это время используют прежние курсы.
+    При сбое обновления прежние курсы продолжают использоваться, а повторный запрос - через RETRY_DELAY сек.
+    """
+
+    def __init__(self, url: str = RATES_URL, ttl: float = RATES_TTL) -> None:
+        """
+        :param url: - адрес API курсов валют
+        :param ttl: - периодичность обновления таблицы курсов, сек.
+        :type url: str
+        :type ttl: float
+        """
+        self.__url = url
+        self.__ttl = ttl
+        self.__rates = {BASE_CURRENCY: 1.0}  # таблица в виде (код валюты: единиц базовой валюты за единицу валюты)
+        self.__expires = 0.0
+        self.__lock = threading.Lock()
+
+    def get_rate(self, code: str) -> float:
+        """
+        Геттер для получения курса валюты (единиц базовой валюты за единицу валюты).
+
+        Если курс неизвестен (н-р: курсы еще не получены), то возникает исключение KeyError.
+
+        :param code: - код валюты
+        :type code: str
+        :rtype: float
+        """
+        if code != BASE_CURRENCY and time.monotonic() >= self.__expires and self.__lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self.__lock.release()
+        return self.__rates[code]
+
+    def set_rates(self, rates: Dict[str, float]) -> None:
+        """ Сеттер для записи курсов валют (единиц базовой валюты за единицу валюты). """
+        self.__rates = dict(rates, **{BASE_CURRENCY: 1.0})
+        self.__expires = time.monotonic() + self.__ttl
+
+    def refresh(self) -> None:
+        """ Функция обновления таблицы курсов валют одним API запросом. """
+        try:
+            response = requests.request("GET", self.__url, timeout=10)
+            data = json.loads(response.text)
+            self.set_rates({code: elem['Value'] / elem['Nominal'] for code, elem in data['Valute'].items()})
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError,
+                ZeroDivisionError) as error_rates:
+            print('RateTable error: ', error_rates)
+            self.__expires = time.monotonic() + RETRY_DELAY
+
+
+rate_table = RateTable()
+
+
+def from_base(amount: float, code: str) -> float:
+    """
+    Функция перевода суммы из базовой валюты в указанную.
+
+    :param amount: - сумма в базовой валюте
+    :param code: - код валюты
+    :type amount: float
+    :type code: str
+    :rtype: float
+    """
+
+    return amount / rate_table.get_rate(code)
+
+
+def to_base(amount: float, code: str) -> float:
+    """
+    Функция перевода суммы из указанной валюты в базовую (н-р: для фильтров цены в API запросе).
+
+    :param amount: - сумма в указанной валюте
+    :param code: - код валюты
+    :type amount: float
+    :type code: str
+    :rtype: float
+    """
+
+    return amount * rate_table.get_rate(code)
+
+
+def get_currency(code: str) -> str:
+    """
+    Функция получения валюты для вывода цен пользователю.
+
+    Если курс указанной валюты неизвестен (н-р: сбой получения курсов), то цены выводятся в базовой валюте.
+
+    :param code: - код валюты пользователя
+    :type code: str
+    :rtype: str - код валюты
+    """
+
+    try:
+        rate_table.get_rate(code)
+    except KeyError:
+        return BASE_CURRENCY
+    return code
+
+
+def format_price(amount: float, code: str = BASE_CURRENCY) -> str:
+    """
+    Функция форматирования цены (в базовой валюте) для вывода пользователю в указанной валюте.
+
+    :param amount: - цена в базовой валюте
+    :param code: - код валюты (должен быть получен функцией get_currency)
+    :type amount: float
+    :type code: str
+    :rtype: str
+    """
+
+    if amount == float('inf'):
+        return 'нет данных'
+    value = from_base(amount, code)
+    return f"{value:,.0f} {CURRENCIES.get(code, code)}".replace(',', ' ')
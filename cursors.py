@@ -0,0 +1,114 @@
+import collections
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import admission
+from cache import TTLCache
+
+CURSOR_TTL = 30 * 60  # время жизни неиспользуемого курсора результатов поиска, сек.
+MAX_CURSORS = 10000  # максимальное количество хранимых курсоров
+
+cursor_store = TTLCache(ttl=CURSOR_TTL, max_size=MAX_CURSORS)  # хранилище в виде (ID курсора: курсор)
+cursor_ids = itertools.count(1)
+
+
+class SearchCursor:
+    """
+    Класс курсора результатов поиска гостиниц.
+
+    Хранит уже полученные, но еще не показанные пользователю гостиницы и номер следующей страницы API запроса.
+    Следующие страницы запрашиваются только тогда, когда показанных гостиниц не хватает для очередной порции.
+    """
+
+    def __init__(self, fetch_page: Callable[[int], Tuple[List, bool]], user_id: int, page_number: int = 1,
+                 **options: Any) -> None:
+        """
+        :param fetch_page: - функция получения страницы результатов по её номеру (аргумент page_number), возвращающая
+                             (список гостиниц в виде [(название, информация), ...], флаг последней страницы)
+        :param user_id: - ID пользователя (владельца курсора)
+        :param page_number: - номер первой запрашиваемой страницы
+        :param options: - параметры вывода результатов (н-р: количество фотографий)
+        """
+        self.__fetch_page = fetch_page
+        self.__records = collections.deque()  # полученные, но еще не показанные гостиницы
+        self.__seen = set()  # ID уже полученных гостиниц (для исключения повторов на разных страницах)
+        self.__next_page = page_number
+        self.__finished = False
+        self.__lock = threading.Lock()
+        self.user_id = user_id
+        self.options = options
+        self.shown = 0  # количество показанных гостиниц
+
+    def take(self, count: int) -> Dict:
+        """
+        Функция получения следующей порции гостиниц.
+
+        Сначала гостиницы берутся из уже полученных, а если их не хватает - запрашиваются следующие страницы.
+        Перед запросом каждой страницы проверяется, не начал ли пользователь новый поиск (admission.checkpoint).
+
+        :param count: - количество гостиниц в порции
+        :type count: int
+        :rtype: Dict - словарь гостиниц в виде (название: информация)
+        """
+        with self.__lock:
+            while len(self.__records) < count and not self.__finished:
+                admission.checkpoint()
+                records, self.__finished = self.__fetch_page(page_number=self.__next_page)
+                self.__next_page += 1
+                for name, record in records:
+                    if record['id'] not in self.__seen:
+                        self.__seen.add(record['id'])
+                        self.__records.append((name, record))
+
+            hotels_dict = {}
+            while self.__records and len(hotels_dict) < count:
+                name, record = self.__records.popleft()
+                hotels_dict[name] = record
+            self.shown += len(hotels_dict)
+            return hotels_dict
+
+    def has_more(self) -> bool:
+        """ Функция проверки, что гостиницы для следующей порции еще есть (или могут быть на следующих страницах). """
+        return bool(self.__records) or not self.__finished
+
+
+def save_cursor(cursor: SearchCursor) -> str:
+    """
+    Функция сохранения курсора в хранилище.
+
+    :param cursor: - курсор результатов поиска
+    :type cursor: SearchCursor
+    :rtype: str - ID курсора
+    """
+
+    cursor_id = str(next(cursor_ids))
+    cursor_store.set(cursor_id, cursor)
+    return cursor_id
+
+
+def get_cursor(cursor_id: str, user_id: int) -> Optional[SearchCursor]:
+    """
+    Функция получения курсора из хранилища.
+
+    Каждое обращение продлевает время жизни курсора (CURSOR_TTL отсчитывается от последнего обращения).
+    Курсор другого пользователя не возвращается.
+
+    :param cursor_id: - ID курсора
+    :param user_id: - ID пользователя
+    :type cursor_id: str
+    :type user_id: int
+    :rtype: Optional[SearchCursor]
+    """
+
+    cursor = cursor_store.get(cursor_id)
+    if cursor is None or cursor.user_id != user_id:
+        return None
+    cursor_store.set(cursor_id, cursor)
+    return cursor
+
+
+def delete_cursor(cursor_id: str) -> None:
+    """ Функция удаления курсора (н-р: когда все результаты показаны). """
+
+    cursor_store.delete(cursor_id)
@@ -0,0 +1,106 @@
+import datetime
+import re
+from typing import Optional, Tuple
+
+DATE_FORMAT = '%d.%m.%Y'  # формат дат для пользователя (н-р: 25.12.2026)
+API_DATE_FORMAT = '%Y-%m-%d'  # формат дат для API запроса (н-р: 2026-12-25)
+MAX_NIGHTS = 28  # максимальное количество ночей проживания
+MAX_DAYS_AHEAD = 365  # максимальное количество дней от сегодняшней даты до даты заезда
+MAX_CALENDAR_DAYS = 31  # максимальное количество дней в календаре цен
+
+WEEKDAYS = ('пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс')
+
+
+def get_stay_dates(check_in: Optional[datetime.date] = None, nights: int = 1) -> Tuple[str, str]:
+    """
+    Функция получения дат заезда и выезда для API запроса.
+
+    :param check_in: - дата заезда (по умолчанию - сегодняшняя дата)
+    :param nights: - количество ночей проживания
+    :type check_in: datetime.date
+    :type nights: int
+    :rtype: Tuple[str, str] - (дата заезда, дата выезда) в формате API_DATE_FORMAT
+    """
+
+    if check_in is None:
+        check_in = datetime.date.today()
+    check_out = check_in + datetime.timedelta(days=nights)
+    return check_in.strftime(API_DATE_FORMAT), check_out.strftime(API_DATE_FORMAT)
+
+
+def parse_date(text: str) -> datetime.date:
+    """
+    Функция преобразования даты, введенной пользователем (дд.мм.гггг), в дату.
+
+    Проверяет, что дата не раньше сегодняшней и не позже, чем через MAX_DAYS_AHEAD дней.
+    При ошибке возникает исключение ValueError с сообщением для пользователя.
+
+    :param text: - дата в формате DATE_FORMAT
+    :type text: str
+    :rtype: datetime.date
+    """
+
+    try:
+        date = datetime.datetime.strptime(text.strip().replace('/', '.').replace('-', '.'), DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError(f'Неверный формат даты: {text.strip()}. Введите дату в формате дд.мм.гггг')
+    today = datetime.date.today()
+    if date < today:
+        raise ValueError(f'Дата {date.strftime(DATE_FORMAT)} уже прошла.')
+    if (date - today).days > MAX_DAYS_AHEAD:
+        raise ValueError(f'Дата {date.strftime(DATE_FORMAT)} слишком далеко (не более {MAX_DAYS_AHEAD} дней вперед).')
+    return date
+
+
+def parse_stay(text: str) -> Tuple[str, str]:
+    """
+    Функция получения дат проживания из сообщения пользователя.
+
+    Сообщение может быть:
+    - количеством ночей, начиная с сегодняшней даты (н-р: 3);
+    - датой заезда на одну ночь (н-р: 25.12.2026);
+    - датами заезда и выезда через пробел или дефис (н-р: 25.12.2026 - 28.12.2026).
+    При ошибке возникает исключение ValueError с сообщением для пользователя.
+
+    :param text: - сообщение пользователя
+    :type text: str
+    :rtype: Tuple[str, str] - (дата заезда, дата выезда) в формате API_DATE_FORMAT
+    """
+
+    text = str(text).strip()
+    if text.isdigit():
+        nights = int(text)
+        if not 1 <= nights <= MAX_NIGHTS:
+            raise ValueError(f'Количество ночей должно быть от 1 до {MAX_NIGHTS}.')
+        return get_stay_dates(nights=nights)
+
+    found = re.findall(r"\d{1,2}[./]\d{1,2}[./]\d{4}", text)
+    if len(found) == 1:
+        return get_stay_dates(parse_date(found[0]))
+    if len(found) == 2:
+        check_in, check_out = parse_date(found[0]), parse_date(found[1])
+        nights = (check_out - check_in).days
+        if nights < 1:
+            raise ValueError('Дата выезда должна быть позже даты заезда.')
+        if nights > MAX_NIGHTS:
+            raise ValueError(f'Количество ночей должно быть не более {MAX_NIGHTS}.')
+        return get_stay_dates(check_in, nights)
+    raise ValueError('Введите количество ночей (н-р: 3), дату заезда (н-р: 25.12.2026) '
+                     'или даты заезда и выезда (н-р: 25.12.2026 - 28.12.2026).')
+
+
+def format_stay(check_in: str, check_out: str) -> str:
+    """
+    Функция форматирования дат проживания для вывода пользователю.
+
+    :param check_in: - дата заезда в формате API_DATE_FORMAT
+    :param check_out: - дата выезда в формате API_DATE_FORMAT
+    :type check_in: str
+    :type check_out: str
+    :rtype: str
+    """
+
+    date_in = datetime.datetime.strptime(check_in, API_DATE_FORMAT).date()
+    date_out = datetime.datetime.strptime(check_out, API_DATE_FORMAT).date()
+    return f"с {date_in.strftime(DATE_FORMAT)} по {date_out.strftime(DATE_FORMAT)} " \
+           f"({(date_out - date_in).days} ноч.)"
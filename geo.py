@@ -0,0 +1,182 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple
+
+import admission
+from cache import TTLCache
+
+EARTH_RADIUS = 6371.0  # средний радиус Земли, км.
+CELL_SIZE = 0.02  # размер ячейки пространственного индекса, градусов (около 2 км. по широте)
+GEO_PAGES = 4  # количество страниц каждой сортировки (по цене, по расстоянию от центра) для пространственного индекса
+GEO_MAX_PRICE = 10 ** 7  # верхняя граница цены в запросе по расстоянию от центра (без ограничения), базовая валюта
+GEO_TTL = 6 * 3600  # время жизни пространственного индекса города в кэше, сек.
+SEARCH_RADIUS = 5  # радиус поиска гостиниц рядом с пользователем, км.
+MAX_SEARCH_RADIUS = 20  # максимальный радиус поиска (если в SEARCH_RADIUS ничего не найдено), км.
+NEARBY_LIMIT = 10  # количество выводимых гостиниц рядом с пользователем
+DISTANCE_STEP = 0.5  # шаг округления расстояния при сортировке (в пределах шага дешевые гостиницы идут первыми), км.
+
+# сообщение пользователю об охвате поиска рядом (см. get_destination_index)
+COVERAGE_NOTE = 'Поиск рядом выполняется среди самых дешевых и ближайших к центру гостиниц города, ' \
+                'поэтому другие гостиницы поблизости могут не попасть в результаты.'
+
+index_cache = TTLCache(ttl=GEO_TTL, max_size=256)  # кэш в виде (ID города: пространственный индекс гостиниц)
+
+
+class GridIndex:
+    """
+    Класс пространственного индекса (равномерной сетки) гостиниц.
+
+    Гостиницы раскладываются по ячейкам сетки размером CELL_SIZE градусов, поэтому поиск гостиниц в радиусе
+    от точки проверяет только ячейки, попадающие в этот радиус, а не все гостиницы города.
+    Координаты хранятся уже в радианах (вместе с косинусом широты) для быстрого расчета расстояний.
+    """
+
+    def __init__(self, cell_size: float = CELL_SIZE) -> None:
+        """
+        :param cell_size: - размер ячейки сетки, градусов
+        :type cell_size: float
+        """
+        self.__cell_size = cell_size
+        self.__cells = {}  # словарь в виде ((номер ячейки по широте, по долготе): [точка, ...])
+        self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def add(self, lat: float, lon: float, item: Any) -> None:
+        """
+        Функция добавления точки в индекс.
+
+        :param lat: - широта, градусов
+        :param lon: - долгота, градусов
+        :param item: - данные точки (н-р: гостиница)
+        """
+        lat_rad = math.radians(lat)
+        self.__cells.setdefault(self.__cell(lat, lon), []).append((lat_rad, math.radians(lon), math.cos(lat_rad), item))
+        self.__count += 1
+
+    def query(self, lat: float, lon: float, radius: float) -> List[Tuple[float, Any]]:
+        """
+        Функция поиска точек в радиусе от заданной точки.
+
+        :param lat: - широта, градусов
+        :param lon: - долгота, градусов
+        :param radius: - радиус поиска, км.
+        :type lat: float
+        :type lon: float
+        :type radius: float
+        :rtype: List[Tuple[float, Any]] - список в виде [(расстояние, данные точки), ...]
+        """
+        lat_span = math.degrees(radius / EARTH_RADIUS)
+        lon_span = lat_span / max(math.cos(math.radians(lat)), 1e-6)
+        min_row, min_col = self.__cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self.__cell(lat + lat_span, lon + lon_span)
+        points = [point
+                  for row in range(min_row, max_row + 1)
+                  for col in range(min_col, max_col + 1)
+                  for point in self.__cells.get((row, col), ())]
+        distances = haversine_distances(lat, lon, points)
+        return [(distance, point[3]) for distance, point in zip(distances, points) if distance <= radius]
+
+    def __cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """ Функция получения номера ячейки сетки для координат. """
+        return math.floor(lat / self.__cell_size), math.floor(lon / self.__cell_size)
+
+
+def haversine_distances(lat: float, lon: float, points: Sequence[Tuple]) -> List[float]:
+    """
+    Функция расчета расстояний от заданной точки сразу до всех точек (формула гаверсинусов).
+
+    Всё, что зависит только от заданной точки, вычисляется один раз, а координаты точек уже хранятся в радианах,
+    поэтому на каждую точку приходится лишь несколько операций.
+
+    :param lat: - широта, градусов
+    :param lon: - долгота, градусов
+    :param points: - точки в виде [(широта в радианах, долгота в радианах, косинус широты, ...), ...]
+    :rtype: List[float] - расстояния, км.
+    """
+
+    lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    return [2 * EARTH_RADIUS * asin(sqrt(min(1.0, sin((point_lat - lat_rad) / 2) ** 2 +
+                                            cos_lat * point_cos * sin((point_lon - lon_rad) / 2) ** 2)))
+            for point_lat, point_lon, point_cos, *_ in points]
+
+
+def get_destination_index(destination_id: str) -> GridIndex:
+    """
+    Функция получения пространственного индекса гостиниц города.
+
+    Сначала ищет индекс в кэше (index_cache). Если его там нет, то одновременно запрашиваются первые GEO_PAGES страниц
+    гостиниц города в двух сортировках: по цене (lowprice.get_hotels_page) и по расстоянию от центра города
+    (bestdeal.get_hotels_page без ограничений), и гостиницы с координатами раскладываются по индексу.
+    API не умеет сортировать по расстоянию от произвольной точки, поэтому индекс содержит не все гостиницы города,
+    а не более 2 * GEO_PAGES * PAGE_SIZE самых дешевых и ближайших к центру (об этом сообщается пользователю).
+
+    :param destination_id: - ID города
+    :type destination_id: str
+    :rtype: GridIndex
+    """
+
+    index = index_cache.get(str(destination_id))
+    if index is not None:
+        return index
+
+    import lowprice
+    import bestdeal
+
+    def fetch_page(fetcher: Any, page_number: int) -> Tuple[List, bool]:
+        admission.checkpoint()
+        return fetcher(page_number)
+
+    fetchers = [lambda page_number: lowprice.get_hotels_page(destination_id, page_number),
+                lambda page_number: bestdeal.get_hotels_page(destination_id, 0, GEO_MAX_PRICE, 0, float('inf'),
+                                                             page_number)]
+    jobs = [(fetcher, page_number) for fetcher in fetchers for page_number in range(1, GEO_PAGES + 1)]
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        pages = list(executor.map(admission.bind(fetch_page), *zip(*jobs)))
+    index, seen = GridIndex(), set()
+    for records, _ in pages:
+        for name, record in records:
+            if record.get('coordinate') and record['id'] not in seen:
+                seen.add(record['id'])
+                index.add(*record['coordinate'], (name, record))
+    index_cache.set(str(destination_id), index)
+    return index
+
+
+def get_nearby_hotels(destination_id: str, lat: float, lon: float, limit: int = NEARBY_LIMIT) -> Dict:
+    """
+    Функция поиска гостиниц рядом с пользователем.
+
+    Ищет гостиницы в радиусе SEARCH_RADIUS (если там ничего нет, то радиус удваивается, но не более
+    MAX_SEARCH_RADIUS) и сортирует их по расстоянию, округленному до DISTANCE_STEP, а при равном расстоянии - по цене.
+
+    :param destination_id: - ID города
+    :param lat: - широта пользователя, градусов
+    :param lon: - долгота пользователя, градусов
+    :param limit: - максимальное количество гостиниц
+    :type destination_id: str
+    :type lat: float
+    :type lon: float
+    :type limit: int
+    :rtype: Dict - словарь гостиниц в виде (название: информация), в информации - расстояние до пользователя
+    """
+
+    index = get_destination_index(destination_id)
+    radius = SEARCH_RADIUS
+    while True:
+        found = index.query(lat, lon, radius)
+        if found or radius >= MAX_SEARCH_RADIUS:
+            break
+        radius = min(radius * 2, MAX_SEARCH_RADIUS)
+
+    found.sort(key=lambda hotel: (round(hotel[0] / DISTANCE_STEP), hotel[1][1]['price']))
+    hotels_dict = {}
+    for distance, (name, record) in found[:limit]:
+        text = f"Расстояние от вас: {distance:.1f} км."
+        hotels_dict[name] = dict(record, text=f"{record['text']}\n{text}" if record['text'] else text,
+                                 distance=distance)
+    return hotels_dict
+
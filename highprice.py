@@ -1,8 +1,16 @@
 import json
-import time
 import requests
-from typing import Dict
-from settings import API_KEY
+from typing import Dict, List, Tuple
+import config
+import currency
+import dates
+import profiling
+from cache import TTLCache
+
+PAGE_SIZE = 25  # количество гостиниц на странице API запроса (максимум 25)
+PAGES_TTL = 15 * 60  # время жизни страницы гостиниц в кэше, сек.
+
+pages_cache = TTLCache(ttl=PAGES_TTL, max_size=1024)  # кэш в виде (параметры API запроса: страница)
 
 
 class Hotels:
@@ -19,13 +27,13 @@ class Hotels:
         """
         return self.__hotels_dict
 
-    def set_item(self, arg, value) -> None:
+    def set_item(self, arg, value: Dict) -> None:
         """ Сеттер для записи данных найденного отеля.
 
-        :param arg - ключ (ID отеля)
-        :param value - значение (информация об отеле)
+        :param arg - ключ (название отеля)
+        :param value - значение (ID отеля и информация об отеле)
         :type arg: str
-        :type value: str
+        :type value: Dict
         """
         self.__hotels_dict[arg] = value
 
@@ -34,16 +42,17 @@ class Hotels:
         self.__hotels_dict.clear()
 
 
-def get_hotels_dict(destination_id: int = 0, limit: int = 0, page_number: int = 1) -> Dict:
+def get_hotels_dict(destination_id: int = 0, limit: int = 0, page_number: int = 1, check_in: str = '',
+                    check_out: str = '') -> Dict:
     """
     Функция получения словаря гостиниц.
 
     Принимает на вход ID города и максимальное количество искомых гостиниц.
     Если это первый запрос (page_number: int = 1), то осуществляется очистка словаря гостиниц.
-    Отправляет API запрос на хост "hotels4.p.rapidapi.com".
-    Преобразует полученные данные в словарь в виде (название: стоимость). При этом, если в полученных данных,
-    у какой-либо гостиницы, отсутствуют данные о стоимости, то её стоимости присваивается значение НУЛЯ и
-    эта гостиница не попадает в словарь гостиниц.
+    Получает гостиницы постранично (get_hotels_page).
+    Преобразует полученные данные в словарь в виде (название: ID, стоимость числом и координаты).
+    При этом, если в полученных данных, у какой-либо гостиницы, отсутствуют данные о стоимости, то её стоимости
+    присваивается значение НУЛЯ и эта гостиница не попадает в словарь гостиниц.
 
     Количество гостиниц в словаре ограничено переменной "limit". при этом, если в результате работы цикла, размер
     словаря не достиг предельного значения количества выводимых гостиниц, то функция зацикливается с повышением номера
@@ -52,54 +61,95 @@ def get_hotels_dict(destination_id: int = 0, limit: int = 0, page_number: int =
     :param destination_id: - значение ID города
     :param limit - значение максимального количества выводимых гостиниц
     :param page_number: - значение номера запрашиваемой страницы
+    :param check_in: - дата заезда (гггг-мм-дд), по умолчанию - сегодняшняя дата
+    :param check_out: - дата выезда (гггг-мм-дд), по умолчанию - завтрашняя дата
     :type: int
     """
 
-    days_count = 1
-    time_add = days_count * 86400
-    time_check_in = time.strftime("%Y-%m-%d", time.localtime())
-    time_check_out_secs = time.mktime(time.localtime()) + time_add
-    time_check_out = time.strftime("%Y-%m-%d", time.localtime(time_check_out_secs))
+    if not check_in or not check_out:
+        check_in, check_out = dates.get_stay_dates()
 
     hotels = Hotels()
     while len(hotels.get_dict()) < limit:
-        # print('page_number', page_number)
-
-        url = "https://hotels4.p.rapidapi.com/properties/list"
-        querystring = {"adults1": "1",
-                       "pageNumber": "1",  # номер страницы с которой осуществляется запрос данных.
-                       "destinationId": destination_id,  # ID города.
-                       "pageSize": "25",  # количество выдаваемых значений при запросе с сайта (максимум 25).
-                       "checkOut": time_check_out,  # время выезда.
-                       "checkIn": time_check_in,  # время заселения.
-                       "sortOrder": "PRICE_HIGHEST_FIRST",  # отвечает за сортировку (СНАЧАЛА ДОРОГИЕ).
-                       "locale": "ru_RU",  # отвечает за язык вывода гостиниц и единиц измерения расстояния (н-р: км.).
-                       "currency": "RUB"}  # отвечает за конвертацию стоимости в конкретную валюту (н-р: RUB).
-        headers = {
-            'x-rapidapi-key': API_KEY,
-            'x-rapidapi-host': "hotels4.p.rapidapi.com"
-        }
-
-        response = requests.request("GET", url, headers=headers, params=querystring)
-        data = json.loads(response.text)
-
-        for elem in data['data']['body']['searchResults']['results']:
-            try:
-                price = elem['ratePlan']['price']['current']
-            except KeyError:
-                price = 0
-
+        records, finished = get_hotels_page(destination_id, page_number, check_in, check_out)
+        for name, record in records:
             if len(hotels.get_dict()) < limit:
-                if price != 0:
-                    text = f"Стоимость: {price}"
-                    hotels.set_item(elem['name'], text)
+                hotels.set_item(name, record)
             else:
                 break
-
+        if finished:  # страницы с результатами закончились
+            break
         page_number += 1
 
     return hotels.get_dict()
 
 
+def get_hotels_page(destination_id: int = 0, page_number: int = 1, check_in: str = '',
+                    check_out: str = '') -> Tuple[List[Tuple[str, Dict]], bool]:
+    """
+    Функция получения одной страницы гостиниц.
+
+    Отправляет API запрос на хост "hotels4.p.rapidapi.com" и преобразует полученные данные в список в виде
+    [(название, ID, стоимость числом и координаты), ...].
+    Гостиницы с нулевой стоимостью в список не попадают.
+    Страница сначала ищется в кэше (pages_cache). Цены запрашиваются и кэшируются только в базовой валюте
+    (currency.BASE_CURRENCY) и переводятся в валюту пользователя при выводе, поэтому валюта в ключ кэша не входит.
+    Запрос и разбор страницы записываются в разбивку медленного поиска как отдельные этапы (profiling.phase).
+
+    :param destination_id: - значение ID города
+    :param page_number: - значение номера запрашиваемой страницы
+    :param check_in: - дата заезда (гггг-мм-дд), по умолчанию - сегодняшняя дата
+    :param check_out: - дата выезда (гггг-мм-дд), по умолчанию - завтрашняя дата
+    :rtype: Tuple[List[Tuple[str, Dict]], bool] - (список гостиниц, флаг последней страницы)
+    """
+
+    if not check_in or not check_out:
+        check_in, check_out = dates.get_stay_dates()
+
+    key = (str(destination_id), page_number, check_in, check_out, config.LOCALE)
+    page = pages_cache.get(key)
+    if page is not None:
+        return page
+
+    url = "https://hotels4.p.rapidapi.com/properties/list"
+    querystring = {"adults1": "1",
+                   "pageNumber": page_number,  # номер страницы с которой осуществляется запрос данных.
+                   "destinationId": destination_id,  # ID города.
+                   "pageSize": PAGE_SIZE,  # количество выдаваемых значений при запросе с сайта (максимум 25).
+                   "checkOut": check_out,  # время выезда.
+                   "checkIn": check_in,  # время заселения.
+                   "sortOrder": "PRICE_HIGHEST_FIRST",  # отвечает за сортировку (СНАЧАЛА ДОРОГИЕ).
+                   "locale": config.LOCALE,  # отвечает за язык вывода гостиниц и единиц измерения расстояния.
+                   "currency": currency.BASE_CURRENCY}  # цены всегда в базовой валюте (перевод - при выводе).
+    headers = {
+        'x-rapidapi-key': config.API_KEY,
+        'x-rapidapi-host': "hotels4.p.rapidapi.com"
+    }
+
+    with profiling.phase(f"fetch page {page_number}"):
+        response = requests.request("GET", url, headers=headers, params=querystring)
+    with profiling.phase(f"parse page {page_number}"):
+        data = json.loads(response.text)
+
+        records = []
+        results = data['data']['body']['searchResults']['results']
+        for elem in results:
+            try:
+                exact_price = float(elem['ratePlan']['price']['exactCurrent'])
+            except KeyError:
+                exact_price = 0
+
+            if exact_price != 0:
+                coordinate = elem.get('coordinate')  # координаты гостиницы (для поиска гостиниц рядом)
+                if coordinate:
+                    coordinate = (coordinate['lat'], coordinate['lon'])
+                records.append((elem['name'], {'id': elem['id'], 'text': '', 'price': exact_price,
+                                               'coordinate': coordinate}))
+
+        page = records, len(results) < PAGE_SIZE
+    pages_cache.set(key, page)
+    return page
+
+
 if __name__ == "__main__":
     get_hotels_dict()
@@ -0,0 +1,219 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import currency
+import dates
+
+HISTORY_DB = 'history.sqlite3'  # файл базы данных истории поиска
+RETENTION_DAYS = 90  # срок хранения записей истории, дней
+MAINTENANCE_INTERVAL = 3600  # периодичность удаления устаревших записей, сек.
+PAGE_SIZE = 5  # количество записей истории на одной странице
+RECORD_HOTELS = 5  # количество гостиниц, названия которых выводятся в записи истории (об остальных - "и ещё N")
+MAX_RECORD_LENGTH = 800  # максимальная длина записи истории (страница укладывается в одно сообщение Телеграм)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    created INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    params TEXT NOT NULL,
+    hotels TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_user_id ON history (user_id, id);
+CREATE INDEX IF NOT EXISTS history_created ON history (created);
+"""
+
+
+class HistoryStore:
+    """
+    Класс для хранения истории поиска пользователей в базе данных SQLite.
+
+    История пополняется только добавлением записей (append-only). Запись в базу осуществляется отдельным фоновым
+    потоком через очередь, поэтому обработчики сообщений БОТа не ждут окончания записи на диск.
+    Чтение страниц истории осуществляется по индексу (user_id, id) без OFFSET, поэтому время получения страницы не
+    зависит от общего количества записей в базе.
+    """
+
+    def __init__(self, path: str = HISTORY_DB, retention_days: int = RETENTION_DAYS) -> None:
+        """
+        :param path: - путь к файлу базы данных
+        :param retention_days: - срок хранения записей истории, дней
+        :type path: str
+        :type retention_days: int
+        """
+        self.__path = path
+        self.__retention_days = retention_days
+        self.__queue = queue.Queue()
+        self.__local = threading.local()  # соединения с базой для чтения (своё для каждого потока)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.execute('PRAGMA auto_vacuum = INCREMENTAL')  # для новой базы действует только до перехода в WAL
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:  # база, созданная без incremental vacuum
+            connection.execute('VACUUM')  # режим меняется только полной перестройкой базы (один раз)
+        connection.close()
+        self.__writer = threading.Thread(target=self.__write_loop, name='history-writer', daemon=True)
+        self.__writer.start()
+
+    def add(self, user_id: int, command: str, params: Dict, hotels: List) -> None:
+        """
+        Функция добавления записи в историю (не блокирует вызывающий поток).
+
+        :param user_id: - ID пользователя
+        :param command: - команда поиска (lowprice, highprice, bestdeal)
+        :param params: - параметры поиска (город, лимиты и т.д.)
+        :param hotels: - краткий список найденных гостиниц в виде [[ID гостиницы, название], ...]
+        :type user_id: int
+        :type command: str
+        :type params: Dict
+        :type hotels: List
+        """
+        self.__queue.put((user_id, int(time.time()), command,
+                          json.dumps(params, ensure_ascii=False, separators=(',', ':')),
+                          json.dumps(hotels, ensure_ascii=False, separators=(',', ':'))))
+
+    def get_page(self, user_id: int, before_id: Optional[int] = None, limit: int = PAGE_SIZE) -> List[Dict]:
+        """
+        Геттер для получения страницы истории пользователя (от новых записей к старым).
+
+        :param user_id: - ID пользователя
+        :param before_id: - ID записи, начиная с которой (не включительно) выводится страница.
+                            Если не указан, то выводится первая страница.
+        :param limit: - количество записей на странице
+        :type user_id: int
+        :type before_id: int
+        :type limit: int
+        :rtype: List[Dict]
+        """
+        connection = self.__reader()
+        if before_id is None:
+            rows = connection.execute('SELECT id, created, command, params, hotels FROM history '
+                                      'WHERE user_id = ? ORDER BY id DESC LIMIT ?', (user_id, limit))
+        else:
+            rows = connection.execute('SELECT id, created, command, params, hotels FROM history '
+                                      'WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                                      (user_id, before_id, limit))
+        return [{'id': row_id, 'created': created, 'command': command,
+                 'params': json.loads(params), 'hotels': json.loads(hotels)}
+                for row_id, created, command, params, hotels in rows]
+
+    def flush(self) -> None:
+        """ Функция ожидает записи в базу всех добавленных записей. """
+        self.__queue.join()
+
+    def purge(self) -> None:
+        """
+        Функция удаления записей старше срока хранения (retention_days) и сжатия базы данных.
+
+        Записи удаляются в фоновом потоке записи, поэтому функция только ставит задачу в очередь.
+        """
+        self.__queue.put(None)
+
+    def __connect(self) -> sqlite3.Connection:
+        """ Функция создает соединение с базой данных (WAL режим: чтение не блокируется записью). """
+        connection = sqlite3.connect(self.__path, timeout=30, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def __reader(self) -> sqlite3.Connection:
+        """ Геттер для получения соединения для чтения текущего потока. """
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = self.__local.connection = self.__connect()
+        return connection
+
+    def __write_loop(self) -> None:
+        """
+        Функция фонового потока записи.
+
+        Забирает из очереди все накопившиеся записи и записывает их в базу одной транзакцией.
+        Если очередь пуста дольше MAINTENANCE_INTERVAL, или получена задача (None), то удаляет устаревшие записи.
+        Ошибка записи теряет только текущую порцию записей: поток продолжает работу, а flush не зависает.
+        """
+        connection = self.__connect()
+        last_maintenance = time.monotonic()
+        while True:
+            try:
+                items = [self.__queue.get(timeout=MAINTENANCE_INTERVAL)]
+            except queue.Empty:
+                items = []
+            while True:
+                try:
+                    items.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [item for item in items if item is not None]
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany('INSERT INTO history (user_id, created, command, params, hotels) '
+                                               'VALUES (?, ?, ?, ?, ?)', rows)
+                if len(rows) < len(items) or time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    last_maintenance = time.monotonic()
+                    self.__maintenance(connection)
+            except sqlite3.Error as error_history:
+                print('HistoryStore error: ', error_history)
+                logging.exception("Ошибка записи истории поиска")
+            finally:
+                for _ in items:
+                    self.__queue.task_done()
+
+    def __maintenance(self, connection: sqlite3.Connection) -> None:
+        """ Функция удаляет устаревшие записи и возвращает освободившееся место (incremental vacuum + checkpoint). """
+        border = int(time.time()) - self.__retention_days * 86400
+        with connection:
+            connection.execute('DELETE FROM history WHERE created < ?', (border,))
+        connection.executescript('PRAGMA incremental_vacuum;')  # execute освобождает только одну страницу за шаг
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')  # после vacuum, чтобы файл базы уменьшился сразу
+
+
+def format_record(record: Dict) -> str:
+    """
+    Функция форматирования записи истории для вывода пользователю.
+
+    Выводятся названия первых RECORD_HOTELS гостиниц, а запись обрезается до MAX_RECORD_LENGTH символов, поэтому
+    страница истории (PAGE_SIZE записей) всегда помещается в одно сообщение.
+
+    :param record: - запись истории
+    :type record: Dict
+    :rtype: str
+    """
+
+    params = record['params']
+    text = f"{time.strftime('%d-%m-%Y %H:%M', time.localtime(record['created']))} /{record['command']}\n" \
+           f"Город: {params.get('city', '')}\n"
+    if params.get('check_in') and params.get('check_out'):
+        text += f"Даты проживания: {dates.format_stay(params['check_in'], params['check_out'])}\n"
+    if record['command'] == 'bestdeal':
+        sign = currency.CURRENCIES.get(params.get('currency', currency.BASE_CURRENCY), '')
+        text += f"Стоимость: {params.get('min_price')} - {params.get('max_price')} {sign}\n" \
+                f"Расстояние от центра города: {params.get('min_distance')} - {params.get('max_distance')} км.\n"
+    if record['hotels']:
+        text += 'Гостиницы: ' + ', '.join(name for _, name in record['hotels'][:RECORD_HOTELS])
+        if len(record['hotels']) > RECORD_HOTELS:
+            text += f" и ещё {len(record['hotels']) - RECORD_HOTELS}"
+    else:
+        text += 'Ничего не найдено'
+    if len(text) > MAX_RECORD_LENGTH:
+        text = text[:MAX_RECORD_LENGTH - 3] + '...'
+    return text
+
+
+def get_hotels_refs(hotels_dict: Dict) -> List[Any]:
+    """
+    Функция получения краткого списка гостиниц для записи в историю.
+
+    :param hotels_dict: - словарь гостиниц в виде (название: {'id': ID, 'text': информация})
+    :type hotels_dict: Dict
+    :rtype: List - список в виде [[ID гостиницы, название], ...]
+    """
+
+    return [[hotel['id'], name] for name, hotel in hotels_dict.items()]
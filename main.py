@@ -2,27 +2,44 @@
 # -*- coding: utf-8 -*-
 
 import functools
-import json
 import logging
+import math
 import re
-from typing import Any, Dict, Callable
-import time
-import requests
+import threading
+from typing import Any, Dict, Callable, Iterable
 import telebot
 
-import bestdeal
-import highprice
-import lowprice
-
-try:
-    from settings import BOT_TOKEN, API_KEY
-except ImportError:
-    exit('В файле settings.py нужно создать BOT_TOKEN и API_KEY пример в settings.default.txt')
-
-# print('BOT_TOKEN: ', BOT_TOKEN)
-# print('API_KEY: ', API_KEY)
-bot = telebot.TeleBot(BOT_TOKEN)
+import admission
+import cities
+import config
+import currency
+import cursors
+import dates
+import history
+import photos
+import profiling
+import states
+import watch
+
+# Модули поиска гостиниц (lowprice, highprice, bestdeal, compare) импортируются при первом поиске.
+# БОТ, хранилища истории и подписок создаются функцией create_bot, запуск БОТа - в модуле run.py.
+bot = None
+history_store = None
+watch_list = None
+watch_scheduler = None
+city_debouncer = None
 users_id_dict = {}
+MAX_MESSAGE_LENGTH = 4096  # максимальная длина сообщения Телеграм
+commands_text = 'Команды:\n' \
+                '/lowprice - для поиска самых дешевых отелей.\n' \
+                '/highprice - для поиска самых дорогих отелей.\n' \
+                '/bestdeal - для поиска самых лучших (близко и дешево) отелей.\n' \
+                '/compare - для сравнения цен в нескольких городах.\n' \
+                '/calendar - для поиска самых дешевых дат.\n' \
+                '/nearby - для поиска отелей рядом с вами.\n' \
+                '/watch - подписка на снижение цен в городе.\n' \
+                '/currency - выбор валюты цен.\n' \
+                '/history - история поиска.'
 
 
 class Variables:
@@ -35,7 +52,12 @@ class Variables:
                             'min_price': 0,
                             'max_price': 0,
                             'min_distance': 0,
-                            'max_distance': 0
+                            'max_distance': 0,
+                            'photos_count': 0,
+                            'check_in': '',  # дата заезда (гггг-мм-дд)
+                            'check_out': '',  # дата выезда (гггг-мм-дд)
+                            'currency': currency.BASE_CURRENCY,  # валюта вывода и ввода цен
+                            'state': states.START  # текущее состояние диалога
                             }
         self.__cities = {}  # словарь для хранения найденных городов
 
@@ -97,6 +119,28 @@ class Variables:
         """ функция меняет местами две переменные. """
         self.__variables[arg_1], self.__variables[arg_2] = self.__variables[arg_2], self.__variables[arg_1]
 
+    def to_dict(self) -> Dict:
+        """
+        Функция сериализации переменных пользователя (включая состояние диалога) в словарь.
+
+        :rtype [Dict]
+        """
+        return {'variables': dict(self.__variables), 'cities': dict(self.__cities)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Variables':
+        """
+        Функция восстановления переменных пользователя из словаря (см. to_dict).
+
+        :param data - словарь переменных пользователя
+        :type data: Dict
+        :rtype Variables
+        """
+        variables = cls()
+        variables.__variables.update(data.get('variables', {}))
+        variables.__cities.update(data.get('cities', {}))
+        return variables
+
 
 def my_logging(func: Callable) -> Callable:
     """
@@ -138,25 +182,123 @@ def my_logging(func: Callable) -> Callable:
     return wrapped_func
 
 
-@bot.message_handler(commands=['help', 'start', 'hello_world', 'lowprice', 'highprice', 'bestdeal'])
+def throttled(func: Callable) -> Callable:
+    """
+    Декоратор ограничения частоты запросов пользователя (admission.controller.allow).
+
+    Применяется к обработчикам при их регистрации (create_bot), поэтому вызовы обработчиков друг из друга
+    не ограничиваются. Если пользователь превысил допустимую частоту запросов, то сообщение (нажатие кнопки)
+    не обрабатывается.
+
+    :param func: обработчик сообщений или нажатий кнопок
+    :return: wrapped_func
+    """
+
+    @functools.wraps(func)
+    def wrapped_func(message: Any, *args, **kwargs) -> Any:
+        if admission.controller.allow(message.from_user.id):
+            return func(message, *args, **kwargs)
+        if hasattr(message, 'data'):  # нажатие кнопки
+            bot.answer_callback_query(callback_query_id=message.id, text='Слишком часто. Подождите немного.')
+        else:
+            bot.send_message(message.chat.id, 'Слишком много запросов. Подождите немного.')
+
+    return wrapped_func
+
+
+def single_search(func: Callable) -> Callable:
+    """
+    Декоратор допуска поиска к выполнению (admission.controller.search).
+
+    У пользователя выполняется не более одного поиска: новый поиск отменяет предыдущий, а отмененный поиск
+    завершается без сообщений. Поиски всех пользователей выполняются по общей очереди (не более
+    admission.MAX_SEARCHES одновременно). Если очередь переполнена, то пользователю выводится сообщение об этом.
+
+    :param func: функция поиска (первый аргумент - сообщение или нажатие кнопки)
+    :return: wrapped_func
+    """
+
+    @functools.wraps(func)
+    def wrapped_func(message: Any, *args, **kwargs) -> Any:
+        try:
+            with admission.controller.search(message.from_user.id):
+                return func(message, *args, **kwargs)
+        except admission.SearchCancelled:
+            return None
+        except admission.SearchRejected as error_rejected:
+            chat_id = message.message.chat.id if hasattr(message, 'data') else message.chat.id
+            bot.send_message(chat_id, str(error_rejected))
+
+    return wrapped_func
+
+
+@my_logging
+def show_history(message: Any) -> None:
+    """
+    Функция вывода истории поиска пользователя.
+
+    Выводит первую (самую новую) страницу истории поиска пользователя (send_history_page).
+
+    :param message: - получаемое сообщение
+    :type: message: Any
+    """
+
+    send_history_page(message.chat.id, message.from_user.id)
+
+
+def send_history_page(chat_id: int, user_id: int, before_id: Any = None) -> None:
+    """
+    Функция вывода страницы истории поиска.
+
+    Выводит одну страницу истории (history.PAGE_SIZE записей, от новых к старым). Если страница заполнена полностью,
+    то под ней выводится кнопка "Далее", нажатие которой обрабатывается функцией "next_history_page".
+
+    :param chat_id: - ID чата
+    :param user_id: - ID пользователя
+    :param before_id: - ID записи истории, начиная с которой (не включительно) выводится страница
+    :type: chat_id: int
+           user_id: int
+           before_id: int
+    """
+
+    records = history_store.get_page(user_id, before_id)
+    if not records:
+        bot.send_message(chat_id, 'История поиска пуста.' if before_id is None else 'Больше записей нет.')
+        return
+    text = '\n\n'.join(history.format_record(record) for record in records)
+    keyboard = None
+    if len(records) == history.PAGE_SIZE:
+        keyboard = telebot.types.InlineKeyboardMarkup()
+        keyboard.add(telebot.types.InlineKeyboardButton(text='Далее',
+                                                        callback_data=states.encode_callback(
+                                                            states.HISTORY, records[-1]['id'])))
+    bot.send_message(chat_id, text, reply_markup=keyboard)
+
+
 @my_logging
 def start_message(message: Any) -> None:
     """
     Стартовая функция.
 
-    Принимает на вход команды:  '/help', '/hello_world', '/lowprice', '/highprice' и '/bestdeal'.
+    Принимает на вход команды:  '/help', '/hello_world', '/lowprice', '/highprice', '/bestdeal', '/compare',
+    '/calendar', '/nearby', '/watch' и '/currency'.
     Команда:
         /help - выводит подсказку, как начать работать с БОТом
         /hello_world - выводит приветственное сообщение и команды для работы с БОТом
         /lowprice - для поиска самого дешевого жилья
         /highprice - для поиска самого дорогого жилья
         /bestdeal - для поиска самого лучшего жилья
+        /compare - для сравнения цен в нескольких городах
+        /calendar - для поиска самых дешевых дат
+        /nearby - для поиска жилья рядом с пользователем (по местоположению из Телеграм)
+        /watch - для подписки на снижение цен (сначала выводятся текущие подписки пользователя)
+        /currency - для выбора валюты цен
 
     Если это первый вызов для пользователя, то создается объект класса "Переменные" (Variables), затем обрабатывает,
     полученные от пользователя команды.
 
-    Далее, получает на вход название искомого города и осуществляет переход к функции (get_city)
-    поиска указанного города.
+    Далее, переводит диалог в состояние ожидания названия искомого города (states.CITY), в котором следующее
+    сообщение пользователя обрабатывается функцией поиска указанного города (get_city).
 
     :param message: - получаемое сообщение
            variables -  переменная для хранения режима работы БОТа, в зависимости от полученной команды.
@@ -170,15 +312,22 @@ def start_message(message: Any) -> None:
         users_id_dict[message.from_user.id] = Variables()
         variables = users_id_dict[message.from_user.id]
     variables.set_arg('mode', None)
+    variables.set_arg('state', states.START)
     if message.text == '/hello_world' or message.text == '/start':
         bot.send_message(message.from_user.id, f'Привет, {message.from_user.first_name}! '
-                                               'Это EasyTravelBot, чем я могу тебе помочь?\n'
-                                               'Команды:\n'
-                                               '/lowprice - для поиска самых дешевых отелей.\n'
-                                               '/highprice - для поиска самых дорогих отелей.\n'
-                                               '/bestdeal - для поиска самых лучших (близко и дешево) отелей.')
+                                               'Это EasyTravelBot, чем я могу тебе помочь?\n' + commands_text)
+    elif message.text == '/history':
+        show_history(message)
     elif message.text == '/help':
         bot.send_message(message.from_user.id, 'Напиши "Привет" или "/hello_world"')
+    elif message.text == '/currency':
+        send_currencies(message.chat.id, variables)
+    elif message.text == '/compare':
+        import compare
+        variables.set_arg('mode', 'compare')
+        bot.send_message(message.from_user.id, f'Введите названия городов (не более {compare.MAX_CITIES}) через точку '
+                                               f'с запятой, например: Москва; Париж; Лондон')
+        variables.set_arg('state', states.COMPARE)
     else:
         if message.text == '/lowprice':
             bot.send_message(message.from_user.id, 'Поиск самых дешевых отелей ...')
@@ -189,20 +338,30 @@ def start_message(message: Any) -> None:
         elif message.text == '/bestdeal':
             bot.send_message(message.from_user.id, 'Поиск самых лучших (близко и дешево) отелей ...')
             variables.set_arg('mode', 'bestdeal')
+        elif message.text == '/calendar':
+            bot.send_message(message.from_user.id, 'Поиск самых дешевых дат ...')
+            variables.set_arg('mode', 'calendar')
+        elif message.text == '/nearby':
+            bot.send_message(message.from_user.id, 'Поиск отелей рядом с вами ...')
+            variables.set_arg('mode', 'nearby')
+        elif message.text == '/watch':
+            send_watches(message.chat.id, message.from_user.id)
+            variables.set_arg('mode', 'watch')
         if variables.get_arg('mode'):
             bot.send_message(message.from_user.id, 'Введите название искомого города \n(на русском или английском): ')
-            bot.register_next_step_handler(message, get_city)
+            variables.set_arg('state', states.CITY)
         else:
             bot.send_message(message.from_user.id, 'В РАЗРАБОТКЕ ... ')
 
 
-@bot.message_handler(content_types=['text'])
 @my_logging
 def get_text_messages(message: Any, crush=False) -> None:
     """
     Стартовая функция.
 
-    Принимает на вход сообщение. Если это сообщение 'Привет' или 'привет', то выводит приветственное сообщение и
+    Принимает на вход сообщение. Если для текущего состояния диалога пользователя в таблице переходов (machine)
+    задан обработчик текстового сообщения, то сообщение передается ему.
+    Иначе, если это сообщение 'Привет' или 'привет', то выводит приветственное сообщение и
     список команд для работы с БОТом.
     Иначе, выводится сообщение с указанием, как начать работу с БОТом.
 
@@ -217,13 +376,14 @@ def get_text_messages(message: Any, crush=False) -> None:
     variables = users_id_dict.get(message.chat.id, None)
     if not variables:
         users_id_dict[message.chat.id] = Variables()
+    elif not crush:
+        handler = machine.get_handler(variables.get_arg('state'), states.TEXT)
+        if handler:
+            handler(message)
+            return
     if str(message.text).lower() == 'привет':
         bot.send_message(message.chat.id, f'Привет, {message.chat.first_name}! '
-                                          'Это EasyTravelBot, чем я могу тебе помочь?\n'
-                                          'Команды:\n'
-                                          '/lowprice - для поиска самых дешевых отелей.\n'
-                                          '/highprice - для поиска самых дорогих отелей.\n'
-                                          '/bestdeal - для поиска самых лучших (близко и дешево) отелей.')
+                                          'Это EasyTravelBot, чем я могу тебе помочь?\n' + commands_text)
     else:
         if crush:
             bot.send_message(message.chat.id, 'Произошел сбой ...')
@@ -234,22 +394,46 @@ def get_text_messages(message: Any, crush=False) -> None:
 
 
 @my_logging
+def get_location_messages(message: Any) -> None:
+    """
+    Функция получения местоположения пользователя.
+
+    Если для текущего состояния диалога пользователя в таблице переходов (machine) задан обработчик местоположения,
+    то сообщение передается ему. Иначе, выводится сообщение с указанием, как начать работу с БОТом.
+
+    :param message: - получаемое сообщение
+    :type: Any
+    """
+
+    variables = users_id_dict.get(message.chat.id, None)
+    handler = machine.get_handler(variables.get_arg('state'), states.LOCATION_SENT) if variables else None
+    if handler:
+        handler(message)
+    else:
+        bot.send_message(message.chat.id, 'Я тебя не понимаю. Напиши /help.')
+
+
+@my_logging
+@profiling.traced
 def get_city(message: Any) -> None:
     """
     Функция поиска города.
 
-    Принимает на вход сообщение с названием города. Затем отправляет API запрос на хост "hotels4.p.rapidapi.com" и
-    преобразует полученные данные в словарь.
-    В полученном словаре ищет элементы, соответствующие группе 'CITY_GROUP' ('group': 'CITY_GROUP'), а в нем элементы,
-    соответствующие типу 'CITY' ('type': 'CITY').
+    Принимает на вход сообщение с названием города.
+    Если город с точно таким названием уже есть в префиксном индексе городов (н-р: название выбрано в inline-режиме),
+    то он сразу считается выбранным (select_city) без API запроса.
+    Иначе, осуществляется поиск городов (cities.search_cities: из кэша или API запросом на хост
+    "hotels4.p.rapidapi.com").
     Затем создает элементы словаря для каждого найденного города в формате: (ID города: Название) и добавляет этот
     город в кнопку клавиатуры БОТа.
     Если ни одного города с указанным названием не будет найдено (длина словаря будет равна НУЛЮ), то выводится
     соответствующее сообщение и запускается функция ввода нового названия (get_city_name).
-    Иначе, выводятся кнопки со всем найденными городами.
+    Иначе, выводятся кнопки со всем найденными городами и диалог переходит в состояние выбора города
+    (states.CITY_CHOICE).
 
     Если вместо названия города придет команда на изменение режима работы, цикл работы БОТа перезапускается (вызывается
     функция "start_message(message)".
+    Поиск города записывается в собственную разбивку (profiling.traced), а не в разбивку последующего поиска гостиниц.
 
     :param message: - получаемое сообщение
            message.text - название города
@@ -257,53 +441,93 @@ def get_city(message: Any) -> None:
            message.text: str
     """
 
+    if message.text.startswith('/'):
+        start_message(message)
+        return
+
+    variables = users_id_dict[message.from_user.id]
+    variables.clear_city()
+    known_city = cities.city_index.get_exact(message.text)
+    if known_city:
+        variables.set_city(known_city['destinationId'], {'caption': known_city['caption']})
+        select_city(message.chat.id, variables, known_city['destinationId'])
+        return
+
+    found = cities.search_cities(message.text)
+    if found is None:
+        bot.send_message(message.chat.id, 'Сбой в получении данных с сервера.')
+        return
+    city_choice = 'Обнаружены следующие города:'
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    for city in found:
+        variables.set_city(city['destinationId'], {'caption': city['caption']})
+        callback_message = states.encode_callback(states.CITY_SELECTED, city['destinationId'])
+        key_city = telebot.types.InlineKeyboardButton(text=city['caption'], callback_data=callback_message)
+        keyboard.add(key_city)
+    if len(variables.get_city_dict()) == 0:
+        bot.send_message(message.chat.id, 'Городов с указанным названием не обнаружено. Попробуйте еще раз.')
+        get_city_name(message)
+    else:
+        bot.send_message(message.chat.id, text=city_choice, reply_markup=keyboard)
+        variables.set_arg('state', states.CITY_CHOICE)
+
+
+def inline_city(query: Any) -> None:
+    """
+    Функция подсказки названий городов в inline-режиме (@бот Моск...).
+
+    Сначала ищет города, название которых начинается с введенного текста, в префиксном индексе городов
+    (cities.city_index), заполняемом результатами предыдущих поисков и файлом cities.CITIES_FILE.
+    Если там ничего не найдено, то (для текста не короче cities.MIN_QUERY_LENGTH) отправляет API запрос поиска
+    городов, но только после паузы в наборе текста (cities.Debouncer), чтобы не отправлять запрос на каждое
+    нажатие клавиши.
+
+    :param query: - получаемый inline-запрос
+           query.query - введенный текст
+    :type: query: Any
+    """
+
+    found = cities.city_index.search(query.query)
+    if found or len(cities.normalize(query.query)) < cities.MIN_QUERY_LENGTH:
+        answer_inline_city(query.id, found)
+    else:
+        city_debouncer.call(query.from_user.id, search_inline_city, query.id, query.query)
+
+
+def search_inline_city(query_id: str, text: str) -> None:
+    """
+    Функция отложенного поиска городов для inline-режима (API запросом) и отправки ответа.
+
+    :param query_id: - ID inline-запроса
+    :param text: - введенный текст
+    :type: query_id: str
+           text: str
+    """
+
+    found = cities.search_cities(text) or []
     try:
-        if message.text.startswith('/'):
-            start_message(message)
-            return
-    except AttributeError:
+        answer_inline_city(query_id, found[:cities.MAX_RESULTS])
+    except telebot.apihelper.ApiException:  # inline-запрос устарел, пока шел поиск
         pass
 
-    else:
-        variables = users_id_dict[message.from_user.id]
-        variables.clear_city()
-        city = message.text
-        url = "https://hotels4.p.rapidapi.com/locations/search"
-        querystring = {"query": city, "locale": "ru_RU"}
-        headers = {
-            'x-rapidapi-key': API_KEY,
-            'x-rapidapi-host': "hotels4.p.rapidapi.com"
-        }
-
-        response = requests.request("GET", url, headers=headers, params=querystring)
-        data = json.loads(response.text)
-        try:
-            city_choice = 'Обнаружены следующие города:'
-            for elem in data['suggestions']:
-                if elem['group'] == 'CITY_GROUP':
-                    keyboard = telebot.types.InlineKeyboardMarkup()
-                    for i_elem in elem['entities']:
-                        if i_elem['type'] == 'CITY':
-                            current_city = re.sub(r"<[^.]*>\b", '', i_elem['caption'])
-                            current_city = re.sub(r"<[^.]*>", '', current_city)
-                            variables.set_city(i_elem['destinationId'], {'caption': current_city})
-                            callback_message = f"{i_elem['destinationId']}|{message.from_user.id}"
-                            key_city = telebot.types.InlineKeyboardButton(text=current_city,
-                                                                          callback_data=callback_message)
-                            keyboard.add(key_city)
-                    if len(variables.get_city_dict()) == 0:
-                        bot.send_message(message.chat.id,
-                                         'Городов с указанным названием не обнаружено. Попробуйте еще раз.')
-                        get_city_name(message)
-                    else:
-                        bot.send_message(message.chat.id, text=city_choice, reply_markup=keyboard)
-        except KeyError:
-            bot.send_message(message.chat.id, 'Сбой в получении данных с сервера.')
-            print("data['message']: ", data['message'])
-        except Exception as error_get_city:
-            print('data_except: ', data)
-            print('Exception: ', error_get_city.__class__)
-            print('Exception: ', error_get_city)
+
+def answer_inline_city(query_id: str, found: Any) -> None:
+    """
+    Функция отправки ответа на inline-запрос в виде списка городов.
+
+    При выборе города пользователем, в чат отправляется название города, которое обрабатывается функцией
+    поиска города (get_city) без API запроса.
+
+    :param query_id: - ID inline-запроса
+    :param found: - список городов в виде {'caption': название, 'destinationId': ID}
+    :type: query_id: str
+           found: List[Dict]
+    """
+
+    results = [telebot.types.InlineQueryResultArticle(
+        id=city['destinationId'], title=city['caption'],
+        input_message_content=telebot.types.InputTextMessageContent(city['caption'])) for city in found]
+    bot.answer_inline_query(query_id, results, cache_time=300)
 
 
 @my_logging
@@ -311,118 +535,393 @@ def get_city_name(message: Any) -> None:
     """
     Функция повторного запроса названия города.
 
-    Принимает на вход сообщение с названием города. Затем вызывает функцию поиска города (get_city)
+    Выводит запрос названия города и переводит диалог в состояние ожидания названия города (states.CITY),
+    в котором следующее сообщение обрабатывается функцией поиска города (get_city).
 
     :param message: - получаемое сообщение
     :type: Any
     """
 
     bot.send_message(message.from_user.id, 'Введите название искомого города \n(на русском или английском): ')
-    bot.register_next_step_handler(message, get_city)
+    users_id_dict[message.from_user.id].set_arg('state', states.CITY)
 
 
-@bot.callback_query_handler(func=lambda call: True)
 @my_logging
 def query_handler(call: Any) -> None:
     """
     Функция обработки результата нажатия кнопки.
 
-    Принимает на вход сообщение с результатом выбора пользователя и его ID. Затем разделяет это сообщение на две
-    соответствующие части.
+    Принимает на вход сообщение с результатом выбора пользователя и декодирует его (states.decode_callback) в
+    событие и аргумент события.
     Затем проверяется имеется для данного пользователя объект класса "Переменные" (наличие данных в словаре
-    "users_id_dict" под ID пользователя).
-    Если результат отрицательный, следовательно, произошел сбой программы и цикл работы БОТа перезапускается
-    (вызывается функция "get_text_messages(call.message, True)", где True - флаг произошедшего сбоя.
-
-    Затем проверяется, что пришло в первой части сообщения (содержание переменной "choice"):
-    Если это цифры, то произошел выбор города.
-    Если это буквы, то произошел выбор действий.
-
-    Для выбора города:
-    Если выбран режим выбора лучшего предложения гостиниц (items_dict['mode'] == 'bestdeal'), то
-    осуществляется переход в функцию получения и обработки минимальной стоимости гостиницы (get_min_price).
-    Иначе, осуществляется переход в функцию получения и обработки количества выводимых гостиниц (get_limit) .
-
-    Для выбора действий:
-    Сначала объявляются переменные, в зависимости от того, на каком этапе произошел выбор действий: на этапе задания
-    цены или дистанции от центра города.
-    Затем:
-    Если был выбор "поменять местами" ('replace'), то вызывается функция замены местами двух переменных
-    variables.replace(min_value, max_value) и переход на следующий этап ('next_step').
-    Если был выбор "ввести все значения заново" ('rewrite'), то осуществляется переход на начало текущего этапа
-    ('prev_step').
+    "users_id_dict" под ID пользователя) и известен ли формат кнопки.
+    Если результат отрицательный, следовательно, произошел сбой программы (или кнопка осталась от предыдущей версии
+    БОТа) и цикл работы БОТа перезапускается (вызывается функция "get_text_messages(call.message, True)",
+    где True - флаг произошедшего сбоя.
+
+    Затем, по текущему состоянию диалога и событию, в таблице переходов (machine) ищется обработчик нажатия кнопки.
+    Если обработчик не найден, то кнопка относится к уже пройденному этапу диалога и нажатие игнорируется.
 
     :param call: - получаемое сообщение
-           call.data - текст с результатом выбора пользователя и его ID
+           call.data - текст с результатом выбора пользователя (см. states.encode_callback)
     :type: call: Any
-           call.data: int
+           call.data: str
     """
 
-    temp = call.data.split('|')
-    choice = temp[0]  # результат выбора пользователя
-    user_id = int(temp[1])  # ID пользователя
-    variables = users_id_dict.get(user_id, None)
-    if not variables:
+    event, arg = states.decode_callback(call.data)
+    variables = users_id_dict.get(call.from_user.id, None)
+    if not variables or not event:
         bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
         get_text_messages(call.message, True)
         return
 
-    if choice.isdigit():  # выбор города
-        variables.set_arg('destination_id', choice)
-        chosen_city = variables.get_city(choice)
-        if chosen_city:
-            choice_message = f"Вы выбрали: {variables.get_city(choice)['caption']}"
-        else:
-            bot.send_message(call.message.chat.id, f"Ошибка! Выбирайте город только из таблицы выше!")
-            get_city(call)
-            return
-        bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
-        # bot.edit_message_text(f"Результаты для города: {cities_dict[call.data]['caption']}",
-        #                       call.message.chat.id, call.message.id)
-        # bot.delete_message(call.message.chat.id, call.message.id)
+    handler = machine.get_handler(variables.get_arg('state'), event)
+    if handler:
+        handler(call, arg)
+    else:
+        bot.answer_callback_query(callback_query_id=call.id, text='Эта кнопка больше не активна.')
         bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
-        bot.send_message(call.message.chat.id, f"Результаты для города: {variables.get_city(choice)['caption']}")
-        if variables.get_arg('mode') == 'bestdeal':
-            bot.send_message(call.message.chat.id, 'Укажите минимальную стоимость, руб')
-            bot.register_next_step_handler(call.message, get_min_price)
-        else:
-            bot.send_message(call.message.chat.id, 'Сколько гостиниц (не более 25) вывести на экран?')
-            bot.register_next_step_handler(call.message, get_limit)
 
-    elif choice.isalpha():  # выбор действия
-        min_value, max_value, prev_step, next_step, prev_message, next_message = '', '', None, None, '', ''
-        bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
-        if re.search('сумму', call.message.text):  # этап цены
-            min_value, max_value, prev_step, next_step = 'min_price', 'max_price', get_min_price, get_min_distance
-            prev_message = 'Укажите минимальную стоимость, руб'
-            next_message = 'Укажите минимальную дальность от центра города, км.: '
-        elif re.search('дистанцию', call.message.text):  # этап дистанции
-            min_value, max_value, prev_step, next_step = 'min_distance', 'max_distance', get_min_distance, get_limit
-            prev_message = 'Укажите минимальную дальность от центра города, км.: '
-            next_message = 'Сколько гостиниц (не более 25) вывести на экран?'
-
-        if choice == 'replace':
-            variables.replace(min_value, max_value)
-            choice_message = 'Вы выбрали: Поменять местами максимальное и минимальное значение.'
-            bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
-            bot.send_message(call.message.chat.id, choice_message)
-            bot.send_message(call.message.chat.id, f"Минимальное значение {variables.get_arg(min_value)} \n"
-                                                   f"Максимальное значение {variables.get_arg(max_value)} ")
-            bot.send_message(call.message.chat.id, next_message)
-            bot.register_next_step_handler(call.message, next_step)
-        elif choice == 'rewrite':
-            choice_message = 'Вы выбрали: Попробовать ввести все значения заново.'
-            bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
-            bot.send_message(call.message.chat.id, choice_message)
-            bot.send_message(call.message.chat.id, prev_message)
-            bot.register_next_step_handler(call.message, prev_step)
+
+def choose_city(call: Any, destination_id: str) -> None:
+    """
+    Функция обработки нажатия кнопки выбора города.
+
+    Проверяет, что город есть в списке найденных городов и осуществляет переход в функцию выбора города (select_city).
+
+    :param call: - получаемое сообщение
+    :param destination_id: - ID выбранного города
+    :type: call: Any
+           destination_id: str
+    """
+
+    variables = users_id_dict[call.from_user.id]
+    chosen_city = variables.get_city(destination_id)
+    if not chosen_city:
+        bot.answer_callback_query(callback_query_id=call.id)
+        bot.send_message(call.message.chat.id, f"Ошибка! Выбирайте город только из таблицы выше!")
+        return
+    choice_message = f"Вы выбрали: {chosen_city['caption']}"
+    bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    select_city(call.message.chat.id, variables, destination_id)
+
+
+def select_city(chat_id: int, variables: Variables, destination_id: str) -> None:
+    """
+    Функция выбора города.
+
+    Если выбран режим поиска самых дешевых дат (items_dict['mode'] == 'calendar'), то диалог переходит в
+    состояние получения периода календаря цен (states.CALENDAR).
+    Если выбран режим подписки на снижение цен (items_dict['mode'] == 'watch'), то диалог переходит в
+    состояние получения цены подписки (states.WATCH_PRICE).
+    Если выбран режим поиска гостиниц рядом (items_dict['mode'] == 'nearby'), то выводится кнопка отправки
+    местоположения и диалог переходит в состояние его получения (states.LOCATION).
+    Иначе, диалог переходит в состояние получения дат проживания (states.DATES).
+
+    :param chat_id: - ID чата
+    :param variables: - переменные текущего пользователя
+    :param destination_id: - ID выбранного города
+    :type: chat_id: int
+           variables: Variables
+           destination_id: str
+    """
+
+    variables.set_arg('destination_id', destination_id)
+    bot.send_message(chat_id, f"Результаты для города: {variables.get_city(destination_id)['caption']}")
+    if variables.get_arg('mode') == 'calendar':
+        bot.send_message(chat_id, f'Укажите первую дату заезда и количество дней (не более '
+                                  f'{dates.MAX_CALENDAR_DAYS}), например: 25.12.2026 14\n'
+                                  f'или только количество дней, начиная с сегодняшней даты, например: 14')
+        variables.set_arg('state', states.CALENDAR)
+    elif variables.get_arg('mode') == 'watch':
+        bot.send_message(chat_id, f'Укажите цену за ночь, {get_currency_sign(variables)}, при снижении ниже которой '
+                                  f'прислать уведомление')
+        variables.set_arg('state', states.WATCH_PRICE)
+    elif variables.get_arg('mode') == 'nearby':
+        keyboard = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+        keyboard.add(telebot.types.KeyboardButton(text='Отправить местоположение', request_location=True))
+        bot.send_message(chat_id, 'Отправьте ваше местоположение (кнопкой ниже или через вложения)',
+                         reply_markup=keyboard)
+        variables.set_arg('state', states.LOCATION)
+    else:
+        bot.send_message(chat_id, 'Укажите даты проживания: количество ночей, начиная с сегодняшней даты (например: 1),'
+                                  '\nдату заезда (например: 25.12.2026)\nили даты заезда и выезда '
+                                  '(например: 25.12.2026 - 28.12.2026)')
+        variables.set_arg('state', states.DATES)
+
+
+@my_logging
+def get_stay_dates(message: Any) -> None:
+    """
+    Функция получения дат проживания.
+
+    Принимает на вход сообщение с датами проживания (см. dates.parse_stay).
+    Если даты указаны верно, то:
+    если выбран режим выбора лучшего предложения гостиниц (items_dict['mode'] == 'bestdeal'), то
+    диалог переходит в состояние получения минимальной стоимости гостиницы (states.MIN_PRICE).
+    Иначе, диалог переходит в состояние получения количества выводимых гостиниц (states.LIMIT).
+    При ошибке, выводится сообщение об ошибке и состояние диалога не меняется.
+
+    :param message: - получаемое сообщение
+           message.text - даты проживания
+    :type: message: Any
+           message.text: str
+    """
+
+    if message.text.startswith('/'):
+        start_message(message)
+        return
+    variables = users_id_dict[message.from_user.id]
+    try:
+        check_in, check_out = dates.parse_stay(message.text)
+    except ValueError as error_dates:
+        bot.send_message(message.chat.id, f'{error_dates} Попробуйте еще раз.')
+        return
+    variables.set_arg('check_in', check_in)
+    variables.set_arg('check_out', check_out)
+    bot.send_message(message.chat.id, f"Даты проживания: {dates.format_stay(check_in, check_out)}")
+    if variables.get_arg('mode') == 'bestdeal':
+        bot.send_message(message.chat.id, f'Укажите минимальную стоимость, {get_currency_sign(variables)}')
+        variables.set_arg('state', states.MIN_PRICE)
+    else:
+        bot.send_message(message.chat.id, 'Сколько гостиниц (не более 25) вывести на экран?')
+        variables.set_arg('state', states.LIMIT)
+
+
+@my_logging
+@profiling.traced
+@single_search
+def get_calendar(message: Any) -> None:
+    """
+    Функция поиска самых дешевых дат.
+
+    Принимает на вход сообщение с первой датой и количеством дней (см. price_calendar.parse_window).
+    Минимальные цены на каждую дату запрашиваются одновременно (price_calendar.get_price_calendar) и выводятся в виде
+    календаря цен. При ошибке, выводится сообщение об ошибке и состояние диалога не меняется.
+
+    :param message: - получаемое сообщение
+           message.text - первая дата и количество дней
+    :type: message: Any
+           message.text: str
+    """
+
+    if message.text.startswith('/'):
+        start_message(message)
+        return
+    import price_calendar
+    variables = users_id_dict[message.from_user.id]
+    try:
+        first_day, days = price_calendar.parse_window(message.text)
+    except ValueError as error_window:
+        bot.send_message(message.chat.id, f'{error_window} Попробуйте еще раз.')
+        return
+    variables.set_arg('state', states.START)
+    bot.send_message(message.chat.id, f"Начинаю поиск. Это может занять продолжительное время")
+    calendar = price_calendar.get_price_calendar(variables.get_arg('destination_id'), first_day, days)
+    admission.checkpoint()
+    bot.send_message(message.chat.id, price_calendar.format_calendar(calendar, get_user_currency(variables)))
+
+
+@my_logging
+@profiling.traced
+@single_search
+def get_nearby(message: Any) -> None:
+    """
+    Функция поиска гостиниц рядом с пользователем.
+
+    Принимает на вход сообщение с местоположением пользователя. Гостиницы выбранного города берутся из
+    пространственного индекса (geo.get_nearby_hotels), который запрашивается один раз и хранится в кэше, и выводятся
+    по возрастанию расстояния до пользователя (при близком расстоянии - сначала дешевые).
+    Индекс содержит только самые дешевые и ближайшие к центру гостиницы города, о чем пользователю сообщается
+    после результатов (geo.COVERAGE_NOTE).
+    Если получено текстовое сообщение, то повторно выводится просьба отправить местоположение.
+
+    :param message: - получаемое сообщение
+           message.location - местоположение пользователя
+    :type: message: Any
+    """
+
+    if message.text and message.text.startswith('/'):
+        start_message(message)
+        return
+    if not getattr(message, 'location', None):
+        bot.send_message(message.chat.id, 'Отправьте ваше местоположение кнопкой ниже или через вложения.')
+        return
+    import geo
+    variables = users_id_dict[message.from_user.id]
+    variables.set_arg('state', states.START)
+    bot.send_message(message.chat.id, f"Начинаю поиск. Это может занять продолжительное время",
+                     reply_markup=telebot.types.ReplyKeyboardRemove())
+    hotels_dict = geo.get_nearby_hotels(variables.get_arg('destination_id'), message.location.latitude,
+                                        message.location.longitude)
+    admission.checkpoint()
+    history_store.add(message.from_user.id, 'nearby', get_history_params(variables),
+                      history.get_hotels_refs(hotels_dict))
+    if hotels_dict:
+        send_hotels(message.chat.id, hotels_dict, 0, get_user_currency(variables))
+    else:
+        bot.send_message(message.chat.id, f"Рядом с вами (в радиусе {geo.MAX_SEARCH_RADIUS} км.) ничего не найдено.")
+    bot.send_message(message.chat.id, geo.COVERAGE_NOTE)
+
+
+@my_logging
+def get_watch_price(message: Any) -> None:
+    """
+    Функция подписки на снижение цен.
+
+    Принимает на вход сообщение с ценой за ночь (в валюте пользователя). Если это число, то подписка на выбранный
+    город записывается в хранилище подписок (watch_list) с ценой в базовой валюте, и диалог переходит в начальное
+    состояние. Цены проверяются в фоне
+    (watch.WatchScheduler), а при появлении гостиницы дешевле указанной цены пользователю приходит уведомление.
+    Иначе, выводится сообщение об ошибке и состояние диалога не меняется.
+
+    :param message: - получаемое сообщение
+           message.text - цена за ночь
+    :type: message: Any
+           message.text: str
+    """
+
+    if message.text.startswith('/'):
+        start_message(message)
+        return
+    variables = users_id_dict[message.from_user.id]
+    try:
+        max_price = abs(float(re.sub(r",", '.', message.text)))
+    except ValueError:
+        bot.send_message(message.chat.id, 'Вводить можно только числа. Попробуйте еще раз.')
+        return
+    city = variables.get_city(variables.get_arg('destination_id'))['caption']
+    code = get_user_currency(variables)
+    max_price = currency.to_base(max_price, code)
+    try:
+        watch_list.add(message.from_user.id, message.chat.id, variables.get_arg('destination_id'), city, max_price,
+                       code)
+    except ValueError as error_watch:
+        bot.send_message(message.chat.id, str(error_watch))
+    else:
+        bot.send_message(message.chat.id, f"Подписка оформлена: {city}, дешевле "
+                                          f"{currency.format_price(max_price, code)} за ночь.\n"
+                                          f"Цены проверяются раз в {watch.CHECK_INTERVAL // 60} мин.")
+    variables.set_arg('state', states.START)
+
+
+def send_watches(chat_id: int, user_id: int) -> None:
+    """
+    Функция вывода подписок пользователя на снижение цен с кнопками их удаления (remove_watch).
+
+    :param chat_id: - ID чата
+    :param user_id: - ID пользователя
+    :type: chat_id: int
+           user_id: int
+    """
+
+    watches = watch_list.get_user_watches(user_id)
+    if not watches:
+        return
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    for item in watches:
+        keyboard.add(telebot.types.InlineKeyboardButton(text=f"Удалить: {item['city']}",
+                                                        callback_data=states.encode_callback(
+                                                            states.UNWATCH, item['destination_id'])))
+    lines = [f"{item['city']}: дешевле "
+             f"{currency.format_price(item['max_price'], currency.get_currency(item['currency']))}"
+             for item in watches]
+    text = 'Ваши подписки:\n' + '\n'.join(lines)
+    bot.send_message(chat_id, text, reply_markup=keyboard)
+
+
+def remove_watch(call: Any, destination_id: str) -> None:
+    """
+    Функция обработки нажатия кнопки "Удалить" подписки на снижение цен.
+
+    Состояние диалога не меняется.
+
+    :param call: - получаемое сообщение
+    :param destination_id: - ID города подписки
+    :type: call: Any
+           destination_id: str
+    """
+
+    found = watch_list.remove(call.from_user.id, destination_id)
+    bot.answer_callback_query(callback_query_id=call.id, text='Подписка удалена' if found else 'Подписки уже нет')
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    send_watches(call.message.chat.id, call.from_user.id)
+
+
+def replace_values(call: Any, arg: str) -> None:
+    """
+    Функция обработки выбора "Поменять местами максимальное и минимальное значение".
+
+    Этап (цена или дистанция от центра города) определяется по текущему состоянию диалога (CONFLICT_STAGES).
+    Вызывает функцию замены местами двух переменных и переводит диалог на следующий этап.
+
+    :param call: - получаемое сообщение
+    :param arg: - аргумент события (не используется)
+    :type: call: Any
+           arg: str
+    """
+
+    variables = users_id_dict[call.from_user.id]
+    stage = CONFLICT_STAGES[variables.get_arg('state')]
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    variables.replace(stage['min_value'], stage['max_value'])
+    choice_message = 'Вы выбрали: Поменять местами максимальное и минимальное значение.'
+    bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
+    bot.send_message(call.message.chat.id, choice_message)
+    bot.send_message(call.message.chat.id, f"Минимальное значение {variables.get_arg(stage['min_value'])} \n"
+                                           f"Максимальное значение {variables.get_arg(stage['max_value'])} ")
+    bot.send_message(call.message.chat.id, stage['next_message'])
+    variables.set_arg('state', stage['next_state'])
+
+
+def rewrite_values(call: Any, arg: str) -> None:
+    """
+    Функция обработки выбора "Попробовать ввести все значения заново".
+
+    Этап (цена или дистанция от центра города) определяется по текущему состоянию диалога (CONFLICT_STAGES).
+    Переводит диалог на начало текущего этапа.
+
+    :param call: - получаемое сообщение
+    :param arg: - аргумент события (не используется)
+    :type: call: Any
+           arg: str
+    """
+
+    variables = users_id_dict[call.from_user.id]
+    stage = CONFLICT_STAGES[variables.get_arg('state')]
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    choice_message = 'Вы выбрали: Попробовать ввести все значения заново.'
+    bot.answer_callback_query(callback_query_id=call.id, text=choice_message)
+    bot.send_message(call.message.chat.id, choice_message)
+    bot.send_message(call.message.chat.id, stage['prev_message'].format(currency=get_currency_sign(variables)))
+    variables.set_arg('state', stage['prev_state'])
+
+
+def next_history_page(call: Any, before_id: str) -> None:
+    """
+    Функция обработки нажатия кнопки "Далее" в истории поиска.
+
+    Выводит следующую страницу истории, начиная с записи, предшествующей последней выведенной.
+    Состояние диалога не меняется.
+
+    :param call: - получаемое сообщение
+    :param before_id: - ID последней выведенной записи истории
+    :type: call: Any
+           before_id: str
+    """
+
+    bot.answer_callback_query(callback_query_id=call.id)
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    send_history_page(call.message.chat.id, call.from_user.id, int(before_id))
 
 
 def get_min_price(message: Any) -> None:
     """ Функция шаблонов для получения минимальной стоимости гостиницы. """
 
-    min_price_next_message = 'Укажите максимальную стоимость, руб: '
-    get_min_args(message, 'min_price', min_price_next_message, get_min_price, get_max_price)
+    variables = users_id_dict[message.from_user.id]
+    min_price_next_message = f'Укажите максимальную стоимость, {get_currency_sign(variables)}: '
+    get_min_args(message, 'min_price', min_price_next_message, states.MAX_PRICE)
 
 
 def get_max_price(message: Any) -> None:
@@ -432,14 +931,14 @@ def get_max_price(message: Any) -> None:
     max_price_except = 'Вы ввели максимальную сумму меньше (или равную) минимальной.\n' \
                        'Что желаете сделать?'
     get_max_args(message, 'min_price', 'max_price', max_price_next_message, max_price_except,
-                 get_max_price, get_min_distance)
+                 states.MIN_DISTANCE, states.PRICE_CONFLICT)
 
 
 def get_min_distance(message: Any) -> None:
     """ Функция шаблонов для получения минимальной дистанции между гостиницей и центром города. """
 
     min_distance_next_message = 'Укажите максимальную дальность от центра города, км.: '
-    get_min_args(message, 'min_distance', min_distance_next_message, get_min_distance, get_max_distance)
+    get_min_args(message, 'min_distance', min_distance_next_message, states.MAX_DISTANCE)
 
 
 def get_max_distance(message: Any) -> None:
@@ -449,30 +948,28 @@ def get_max_distance(message: Any) -> None:
     max_distance_except = 'Вы ввели максимальную дистанцию меньше (или равную) минимальной.\n' \
                           'Что желаете сделать?'
     get_max_args(message, 'min_distance', 'max_distance', max_distance_next_message, max_distance_except,
-                 get_max_distance, get_limit)
+                 states.LIMIT, states.DISTANCE_CONFLICT)
 
 
 @my_logging
-def get_min_args(message: Any, min_arg: str, next_message: str, get_minimum: Any, get_maximum: Any) -> None:
+def get_min_args(message: Any, min_arg: str, next_message: str, next_state: str) -> None:
     """
     Функция получения минимального значения аргумента.
 
     Принимает на вход сообщение с минимальным значением аргумента.
     Проверяет, что это сообщение является целым числом.
-    Если так, то осуществляется запрос максимальной суммы и осуществляется переход в функцию получения и обработки этой
-    суммы (get_maximum).
-    Иначе, выводится сообщение об ошибке и текущая функция возвращается к вызвавшей её функции.
+    Если так, то осуществляется запрос максимального значения и диалог переходит в состояние его получения
+    (next_state).
+    Иначе, выводится сообщение об ошибке и состояние диалога не меняется.
 
     :param message: - получаемое сообщение
     :param min_arg: - значение минимального числа
     :param next_message: - сообщение для перехода к следующему этапу
-    :param get_minimum: - переменная для функции назначения
-    :param get_maximum: - переменная для функции назначения
+    :param next_state: - состояние диалога для перехода к следующему этапу
     :type: message: Any
            min_arg: str
            next_message: str
-           get_minimum: func
-           get_maximum: func
+           next_state: str
     """
 
     if message.text.startswith('/'):
@@ -483,15 +980,14 @@ def get_min_args(message: Any, min_arg: str, next_message: str, get_minimum: Any
     try:
         variables.set_arg(min_arg, abs(float(temp)))
         bot.send_message(message.from_user.id, next_message)
-        bot.register_next_step_handler(message, get_maximum)
+        variables.set_arg('state', next_state)
     except ValueError:
         bot.send_message(message.chat.id, 'Вводить можно только числа. Попробуйте еще раз.')
-        bot.register_next_step_handler(message, get_minimum)
 
 
 @my_logging
 def get_max_args(message: Any, min_arg: str, max_arg: str, next_message: str, except_message: str,
-                 get_maximum: Any, get_next: Any) -> None:
+                 next_state: str, conflict_state: str) -> None:
     """
     Функция получения максимального значения аргумента.
 
@@ -499,24 +995,24 @@ def get_max_args(message: Any, min_arg: str, max_arg: str, next_message: str, ex
     Проверяет, что это сообщение является целым числом.
     Если так, то:
     1. осуществляется проверка, что максимальное значение аргумента больше минимального.
-    1.1. если Верно, то осуществляется переход в следующую функцию получения и обработки сообщения (get_next).
-    1.2. иначе, осуществляется переход в функцию получения и обработки минимального значения аргумента (get_minimum).
-    2. при ошибке, выводится сообщение об ошибке и текущая функция возвращается к вызвавшей её функции.
+    1.1. если Верно, то диалог переходит в состояние следующего этапа (next_state).
+    1.2. иначе, выводятся кнопки выбора действий и диалог переходит в состояние выбора действия (conflict_state).
+    2. при ошибке, выводится сообщение об ошибке и состояние диалога не меняется.
 
     :param message: - получаемое сообщение
     :param min_arg: - значение минимального числа
     :param max_arg: - значение максимального числа
     :param next_message: - сообщение для перехода к следующему этапу
     :param except_message: - сообщение об ошибке
-    :param get_maximum: - переменная для функции назначения
-    :param get_next: - переменная для функции (этапа) назначения
+    :param next_state: - состояние диалога следующего этапа
+    :param conflict_state: - состояние диалога выбора действия
     :type: message: Any
            min_arg: str
            max_arg: str
            next_message: str
            except_message: str
-           get_maximum: func
-           get_next: func
+           next_state: str
+           conflict_state: str
     """
 
     if message.text.startswith('/'):
@@ -528,22 +1024,22 @@ def get_max_args(message: Any, min_arg: str, max_arg: str, next_message: str, ex
         variables.set_arg(max_arg, abs(float(temp)))
         if variables.get_arg(max_arg) > variables.get_arg(min_arg):
             bot.send_message(message.from_user.id, next_message)
-            bot.register_next_step_handler(message, get_next)
+            variables.set_arg('state', next_state)
         else:
             except_choice = except_message
             except_choice_1 = 'Поменять местами максимальное и минимальное значение.'
             except_choice_2 = 'Попробовать ввести все значения заново.'
             keyboard_except = telebot.types.InlineKeyboardMarkup()
             key_except_1 = telebot.types.InlineKeyboardButton(text=except_choice_1,
-                                                              callback_data=f'replace|{message.from_user.id}')
+                                                              callback_data=states.encode_callback(states.REPLACE))
             key_except_2 = telebot.types.InlineKeyboardButton(text=except_choice_2,
-                                                              callback_data=f'rewrite|{message.from_user.id}')
+                                                              callback_data=states.encode_callback(states.REWRITE))
             keyboard_except.add(key_except_1)
             keyboard_except.add(key_except_2)
             bot.send_message(message.chat.id, text=except_choice, reply_markup=keyboard_except)
+            variables.set_arg('state', conflict_state)
     except ValueError:
         bot.send_message(message.chat.id, 'Вводить можно только числа. Попробуйте еще раз.')
-        bot.register_next_step_handler(message, get_maximum)
 
 
 @my_logging
@@ -555,9 +1051,9 @@ def get_limit(message: Any) -> None:
     Проверяет, что это сообщение является целым числом.
     Если так, то:
     1. осуществляется проверка, что это значение меньше цифры "25".
-    1.1. если Верно, то осуществляется переход в функцию получения списка гостиниц и их цен (get_price_list).
-    1.2. иначе, выводится сообщение об ошибке и текущая функция зацикливается.
-    2. при ошибке, выводится сообщение об ошибке и текущая функция зацикливается.
+    1.1. если Верно, то диалог переходит в состояние получения количества фотографий (states.PHOTOS).
+    1.2. иначе, выводится сообщение об ошибке и состояние диалога не меняется.
+    2. при ошибке, выводится сообщение об ошибке и состояние диалога не меняется.
 
     :param message: - получаемое сообщение
            message.text - значение количества гостиниц
@@ -570,47 +1066,130 @@ def get_limit(message: Any) -> None:
     try:
         variables.set_arg('hotels_limit', abs(int(message.text)))
         if variables.get_arg('hotels_limit') <= 25:
+            bot.send_message(message.chat.id, f"Сколько фотографий каждой гостиницы (не более {photos.MAX_PHOTOS}) "
+                                              f"вывести на экран? (0 - без фотографий)")
+            variables.set_arg('state', states.PHOTOS)
+        else:
+            bot.send_message(message.chat.id, 'Вы ввели число больше 25. Попробуйте еще раз.')
+    except ValueError:
+        bot.send_message(message.chat.id, 'Вводить можно только числа (целые). Попробуйте еще раз.')
+
+
+@my_logging
+def get_photos_count(message: Any) -> None:
+    """
+    Функция получения количества выводимых на экран фотографий каждой гостиницы.
+
+    Принимает на вход сообщение с количеством фотографий.
+    Если это целое число не больше photos.MAX_PHOTOS, то осуществляется переход в функцию получения списка гостиниц и
+    их цен (get_price_list). Иначе, выводится сообщение об ошибке и состояние диалога не меняется.
+
+    :param message: - получаемое сообщение
+           message.text - значение количества фотографий
+    :type: message: Any
+           message.text: int
+    """
+
+    variables = users_id_dict[message.from_user.id]
+    try:
+        variables.set_arg('photos_count', abs(int(message.text)))
+        if variables.get_arg('photos_count') <= photos.MAX_PHOTOS:
             bot.send_message(message.chat.id, f"Начинаю поиск. Это может занять продолжительное время")
+            variables.set_arg('state', states.START)
             get_price_list(message)
         else:
-            bot.send_message(message.chat.id, 'Вы ввели число больше 25. Попробуйте еще раз.')
-            bot.register_next_step_handler(message, get_limit)
+            bot.send_message(message.chat.id, f'Вы ввели число больше {photos.MAX_PHOTOS}. Попробуйте еще раз.')
     except ValueError:
         bot.send_message(message.chat.id, 'Вводить можно только числа (целые). Попробуйте еще раз.')
-        bot.register_next_step_handler(message, get_limit)
 
 
 @my_logging
+@profiling.traced
+@single_search
+def get_compare_cities(message: Any) -> None:
+    """
+    Функция сравнения цен в нескольких городах.
+
+    Принимает на вход сообщение с названиями городов, разделенными точкой с запятой.
+    Если городов меньше двух или больше compare.MAX_CITIES, то выводится сообщение об ошибке и состояние диалога не
+    меняется.
+    Иначе, поиск самых дешевых гостиниц осуществляется одновременно во всех городах (compare.compare_cities) и
+    выводится сводка: самая дешевая гостиница и распределение цен для каждого города.
+
+    :param message: - получаемое сообщение
+           message.text - названия городов
+    :type: message: Any
+           message.text: str
+    """
+
+    if message.text.startswith('/'):
+        start_message(message)
+        return
+    import compare
+    variables = users_id_dict[message.from_user.id]
+    names = compare.split_cities(message.text)
+    if not 2 <= len(names) <= compare.MAX_CITIES:
+        bot.send_message(message.chat.id, f'Укажите от 2 до {compare.MAX_CITIES} городов через точку с запятой. '
+                                          f'Попробуйте еще раз.')
+        return
+    variables.set_arg('state', states.START)
+    bot.send_message(message.chat.id, f"Начинаю поиск. Это может занять продолжительное время")
+    summaries = compare.compare_cities(names)
+    admission.checkpoint()
+    bot.send_message(message.chat.id, compare.format_comparison(summaries, get_user_currency(variables)))
+
+
+@my_logging
+@profiling.traced
+@single_search
 def get_price_list(message: Any) -> None:
     """
     Функция получения получения списка гостиниц и их цен.
 
-    В зависимости от текущего режима работы БОТа (значения переменной items_dict['mode']), осуществляет запуск (импорт)
-    соответствующего скрипта, передав ему необходимые аргументы.
-    Если, в результате выполнения скрипта, словарь гостиниц окажется НЕ пустым, то на экран будет выведен список из
-    найденных гостиниц и их стоимости. В случае с режимом "bestdeal", будет указана еще и дистанция от центра города.
+    В зависимости от текущего режима работы БОТа (значения переменной items_dict['mode']), создается курсор
+    результатов поиска (cursors.SearchCursor) с функцией постраничного получения гостиниц соответствующего скрипта.
+    Скрипт импортируется при первом поиске в этом режиме.
+    Если первая порция гостиниц окажется НЕ пустой, то она выводится на экран (send_hotels), а если гостиниц может
+    быть больше, то курсор сохраняется и под списком выводится кнопка "Показать ещё" (show_more).
     Иначе, будет выведено сообщение от отсутствии найденных предложений и осуществится запуск функции смены
     названия искомого города (get_city_name) для повторения поиска в текущем режиме..
+    Параметры поиска и краткий список найденных гостиниц записываются в историю поиска (history_store).
+    Стоимость (в режиме "bestdeal") вводится в валюте пользователя и переводится в базовую валюту API запросов.
 
     :param message: - получаемое сообщение
     :type: message: Any
     """
 
-    hotels_dict = {}
     variables = users_id_dict[message.from_user.id]
+    code = get_user_currency(variables)
+    params = {'destination_id': variables.get_arg('destination_id'),
+              'check_in': variables.get_arg('check_in'),
+              'check_out': variables.get_arg('check_out')}
     if variables.get_arg('mode') == 'lowprice':
-        hotels_dict = lowprice.get_hotels_dict(variables.get_arg('destination_id'), variables.get_arg('hotels_limit'))
+        import lowprice
+        fetch_page = functools.partial(lowprice.get_hotels_page, **params)
     elif variables.get_arg('mode') == 'highprice':
-        hotels_dict = highprice.get_hotels_dict(variables.get_arg('destination_id'), variables.get_arg('hotels_limit'))
-    elif variables.get_arg('mode') == 'bestdeal':
-        hotels_dict = bestdeal.get_hotels_dict(variables.get_arg('destination_id'), variables.get_arg('min_price'),
-                                               variables.get_arg('max_price'), variables.get_arg('min_distance'),
-                                               variables.get_arg('max_distance'), variables.get_arg('hotels_limit'))
+        import highprice
+        fetch_page = functools.partial(highprice.get_hotels_page, **params)
+    else:
+        import bestdeal
+        fetch_page = functools.partial(bestdeal.get_hotels_page,
+                                       min_price=round(currency.to_base(variables.get_arg('min_price'), code)),
+                                       max_price=round(currency.to_base(variables.get_arg('max_price'), code)),
+                                       min_distance=variables.get_arg('min_distance'),
+                                       max_distance=variables.get_arg('max_distance'), **params)
+
+    cursor = cursors.SearchCursor(fetch_page, message.from_user.id, hotels_limit=variables.get_arg('hotels_limit'),
+                                  photos_count=variables.get_arg('photos_count'), currency=code)
+    hotels_dict = cursor.take(variables.get_arg('hotels_limit'))
     hotels_quantity = len(hotels_dict)
+    history_store.add(message.from_user.id, variables.get_arg('mode'), get_history_params(variables),
+                      history.get_hotels_refs(hotels_dict))
     if hotels_quantity > 0:
-        for name, price in hotels_dict.items():
-            bot.send_message(message.chat.id, f"Гостиница: {name}\n{price}")
-        if hotels_quantity < variables.get_arg('hotels_limit'):
+        send_hotels(message.chat.id, hotels_dict, variables.get_arg('photos_count'), code)
+        if cursor.has_more():
+            send_more_button(message.chat.id, cursors.save_cursor(cursor))
+        elif hotels_quantity < variables.get_arg('hotels_limit'):
             bot.send_message(message.chat.id,
                              f"Заданным параметрам поиска соответствует лишь {hotels_quantity} гостиниц")
     else:
@@ -618,15 +1197,349 @@ def get_price_list(message: Any) -> None:
         get_city_name(message)
 
 
-try:
-    bot.polling(none_stop=True, interval=0)
-except requests.exceptions.ReadTimeout:
-    time.sleep(1000)
-    print("Переподключение к серверам")
-    logging.exception("Переподключение к серверам")
-    bot.polling(none_stop=True, interval=0)
-except Exception as error_main:
-    print('Unexpected Error: ')
-    print('Exception: ', error_main)
-    print('Exception: ', error_main.__class__)
-    logging.exception("Unexpected Error occurred")
+def send_hotels(chat_id: int, hotels_dict: Dict, photos_count: int, code: str = currency.BASE_CURRENCY) -> None:
+    """
+    Функция вывода гостиниц на экран.
+
+    Стоимость гостиниц (в базовой валюте) переводится в валюту пользователя по таблице курсов (currency.format_price).
+    Если пользователь запросил фотографии, то они одновременно запрашиваются для всех гостиниц
+    (photos.get_photos_dict) и выводятся медиа-группой после описания каждой гостиницы.
+    Если пользователь начал новый поиск, то вывод прекращается (admission.checkpoint).
+    Получение фотографий и вывод - этапы разбивки медленного поиска (profiling.phase).
+
+    :param chat_id: - ID чата
+    :param hotels_dict: - словарь гостиниц в виде (название: информация)
+    :param photos_count: - количество фотографий каждой гостиницы
+    :param code: - код валюты пользователя
+    :type: chat_id: int
+           hotels_dict: Dict
+           photos_count: int
+           code: str
+    """
+
+    photos_dict = {}
+    if photos_count > 0:
+        with profiling.phase('photos'):
+            photos_dict = photos.get_photos_dict([hotel['id'] for hotel in hotels_dict.values()], photos_count)
+    with profiling.phase('send'):
+        for name, hotel in hotels_dict.items():
+            admission.checkpoint()
+            text = f"Гостиница: {name}\nСтоимость: {currency.format_price(hotel['price'], code)}"
+            bot.send_message(chat_id, f"{text}\n{hotel['text']}" if hotel['text'] else text)
+            if photos_dict.get(hotel['id']):
+                photos.send_photos(bot, chat_id, photos_dict[hotel['id']], caption=name)
+
+
+def send_more_button(chat_id: int, cursor_id: str) -> None:
+    """
+    Функция вывода кнопки "Показать ещё" для курсора результатов поиска.
+
+    :param chat_id: - ID чата
+    :param cursor_id: - ID курсора
+    :type: chat_id: int
+           cursor_id: str
+    """
+
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    keyboard.add(telebot.types.InlineKeyboardButton(text='Показать ещё',
+                                                    callback_data=states.encode_callback(states.MORE, cursor_id)))
+    bot.send_message(chat_id, 'Показать следующие гостиницы?', reply_markup=keyboard)
+
+
+@profiling.traced
+@single_search
+def show_more(call: Any, cursor_id: str) -> None:
+    """
+    Функция обработки нажатия кнопки "Показать ещё".
+
+    Берет из курсора результатов поиска следующую порцию гостиниц (того же размера, что и первая) и выводит её.
+    Следующие страницы API запроса запрашиваются только при необходимости, уже показанные гостиницы
+    не повторяются. Курсор хранится cursors.CURSOR_TTL сек. с последнего нажатия, после чего поиск нужно повторить.
+    Состояние диалога не меняется.
+
+    :param call: - получаемое сообщение
+    :param cursor_id: - ID курсора
+    :type: call: Any
+           cursor_id: str
+    """
+
+    bot.answer_callback_query(callback_query_id=call.id)
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    cursor = cursors.get_cursor(cursor_id, call.from_user.id)
+    if cursor is None:
+        bot.send_message(call.message.chat.id, 'Результаты поиска устарели, повторите поиск.')
+        return
+
+    hotels_dict = cursor.take(cursor.options['hotels_limit'])
+    if hotels_dict:
+        send_hotels(call.message.chat.id, hotels_dict, cursor.options['photos_count'], cursor.options['currency'])
+    if cursor.has_more():
+        send_more_button(call.message.chat.id, cursor_id)
+    else:
+        cursors.delete_cursor(cursor_id)
+        bot.send_message(call.message.chat.id, f"Больше гостиниц не найдено (всего показано: {cursor.shown})")
+
+
+@my_logging
+def admin_command(message: Any) -> None:
+    """
+    Функция обработки команд администратора (config.ADMIN_IDS). Для остальных пользователей команды неизвестны.
+
+    Команда:
+        /profile [N] - профилирование БОТа N сек. (по умолчанию profiling.PROFILE_SECONDS), по окончании
+                       администратору отправляется файл свернутых стеков для построения flame graph
+        /slow [N] - разбивка по этапам N последних медленных поисков (дольше profiling.slow_searches.threshold сек.)
+
+    :param message: - получаемое сообщение
+    :type: message: Any
+    """
+
+    if message.from_user.id not in config.ADMIN_IDS:
+        bot.send_message(message.chat.id, 'Я тебя не понимаю. Напиши /help.')
+        return
+    command, _, argument = message.text.partition(' ')
+    try:
+        number = float(argument) if argument.strip() else None
+        if number is not None and not (math.isfinite(number) and number > 0):
+            raise ValueError(argument)
+    except ValueError:
+        bot.send_message(message.chat.id, 'Укажите положительное число, например: /profile 30')
+        return
+
+    if command.startswith('/profile'):
+        seconds = max(1.0, min(number or profiling.PROFILE_SECONDS, profiling.MAX_PROFILE_SECONDS))
+        if profiling.profiler.start(seconds, on_done=lambda path: send_profile(message.chat.id, path)):
+            bot.send_message(message.chat.id, f'Профилирование {seconds:g} сек. ...')
+        else:
+            bot.send_message(message.chat.id, 'Профилирование уже выполняется.')
+    else:
+        traces = profiling.slow_searches.get_traces(max(1, round(number or 5)))
+        if not traces:
+            bot.send_message(message.chat.id, f'Поисков дольше {profiling.slow_searches.threshold:g} сек. не было.')
+        for trace in traces:
+            bot.send_message(message.chat.id, trace.format()[:MAX_MESSAGE_LENGTH])
+
+
+def send_profile(chat_id: int, path: str) -> None:
+    """
+    Функция отправки файла профилирования администратору (вызывается потоком профилировщика).
+
+    :param chat_id: - ID чата
+    :param path: - путь к файлу свернутых стеков
+    :type: chat_id: int
+           path: str
+    """
+
+    with open(path, 'rb') as file:
+        bot.send_document(chat_id, file, caption='Свернутые стеки: flamegraph.pl или https://www.speedscope.app')
+
+
+def get_user_currency(variables: Variables) -> str:
+    """ Функция получения кода валюты пользователя (базовая валюта, если курс выбранной валюты неизвестен). """
+
+    return currency.get_currency(variables.get_arg('currency'))
+
+
+def get_currency_sign(variables: Variables) -> str:
+    """ Функция получения обозначения валюты пользователя (для сообщений с просьбой ввести цену). """
+
+    return currency.CURRENCIES[get_user_currency(variables)]
+
+
+def send_currencies(chat_id: int, variables: Variables) -> None:
+    """
+    Функция вывода кнопок выбора валюты цен (set_currency).
+
+    :param chat_id: - ID чата
+    :param variables: - переменные текущего пользователя
+    :type: chat_id: int
+           variables: Variables
+    """
+
+    keyboard = telebot.types.InlineKeyboardMarkup(row_width=4)
+    keyboard.add(*[telebot.types.InlineKeyboardButton(text=f"{code} {sign}",
+                                                      callback_data=states.encode_callback(states.CURRENCY, code))
+                   for code, sign in currency.CURRENCIES.items()])
+    bot.send_message(chat_id, f'Текущая валюта: {get_user_currency(variables)}. Выберите валюту цен:',
+                     reply_markup=keyboard)
+
+
+def set_currency(call: Any, code: str) -> None:
+    """
+    Функция обработки нажатия кнопки выбора валюты.
+
+    Данные гостиниц запрашиваются и кэшируются только в базовой валюте, поэтому смена валюты не требует новых
+    API запросов: цены переводятся при выводе по таблице курсов (currency.rate_table).
+    Если курс выбранной валюты неизвестен (сбой получения курсов), то валюта не меняется.
+    Состояние диалога не меняется.
+
+    :param call: - получаемое сообщение
+    :param code: - код выбранной валюты
+    :type: call: Any
+           code: str
+    """
+
+    variables = users_id_dict[call.from_user.id]
+    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+    if code not in currency.CURRENCIES or currency.get_currency(code) != code:
+        bot.answer_callback_query(callback_query_id=call.id)
+        bot.send_message(call.message.chat.id, 'Курсы валют временно недоступны, попробуйте позже.')
+        return
+    variables.set_arg('currency', code)
+    bot.answer_callback_query(callback_query_id=call.id, text=f'Валюта: {code}')
+    bot.send_message(call.message.chat.id, f'Цены будут выводиться в валюте: {code} {currency.CURRENCIES[code]}')
+
+
+def get_history_params(variables: Variables) -> Dict:
+    """
+    Функция получения параметров текущего поиска для записи в историю.
+
+    :param variables: - переменные текущего пользователя
+    :type: variables: Variables
+    :rtype: Dict
+    """
+
+    city = variables.get_city(variables.get_arg('destination_id'))
+    params = {'city': city['caption'] if city else '',
+              'destination_id': variables.get_arg('destination_id'),
+              'hotels_limit': variables.get_arg('hotels_limit'),
+              'check_in': variables.get_arg('check_in'),
+              'check_out': variables.get_arg('check_out')}
+    if variables.get_arg('mode') == 'bestdeal':
+        for arg in ('min_price', 'max_price', 'min_distance', 'max_distance', 'currency'):
+            params[arg] = variables.get_arg(arg)
+    return params
+
+
+# этапы ввода пары значений (минимум/максимум) в режиме "bestdeal", в виде (состояние выбора действия: этап)
+CONFLICT_STAGES = {
+    states.PRICE_CONFLICT: {'min_value': 'min_price',
+                            'max_value': 'max_price',
+                            'prev_state': states.MIN_PRICE,
+                            'next_state': states.MIN_DISTANCE,
+                            'prev_message': 'Укажите минимальную стоимость, {currency}',
+                            'next_message': 'Укажите минимальную дальность от центра города, км.: '},
+    states.DISTANCE_CONFLICT: {'min_value': 'min_distance',
+                               'max_value': 'max_distance',
+                               'prev_state': states.MIN_DISTANCE,
+                               'next_state': states.LIMIT,
+                               'prev_message': 'Укажите минимальную дальность от центра города, км.: ',
+                               'next_message': 'Сколько гостиниц (не более 25) вывести на экран?'}
+}
+
+# таблица переходов диалога в виде ((состояние, событие): обработчик)
+machine = states.StateMachine({
+    (states.CITY, states.TEXT): get_city,
+    (states.CITY_CHOICE, states.TEXT): get_city,
+    (states.CITY_CHOICE, states.CITY_SELECTED): choose_city,
+    (states.DATES, states.TEXT): get_stay_dates,
+    (states.CALENDAR, states.TEXT): get_calendar,
+    (states.MIN_PRICE, states.TEXT): get_min_price,
+    (states.MAX_PRICE, states.TEXT): get_max_price,
+    (states.PRICE_CONFLICT, states.REPLACE): replace_values,
+    (states.PRICE_CONFLICT, states.REWRITE): rewrite_values,
+    (states.MIN_DISTANCE, states.TEXT): get_min_distance,
+    (states.MAX_DISTANCE, states.TEXT): get_max_distance,
+    (states.DISTANCE_CONFLICT, states.REPLACE): replace_values,
+    (states.DISTANCE_CONFLICT, states.REWRITE): rewrite_values,
+    (states.LIMIT, states.TEXT): get_limit,
+    (states.PHOTOS, states.TEXT): get_photos_count,
+    (states.COMPARE, states.TEXT): get_compare_cities,
+    (states.LOCATION, states.TEXT): get_nearby,
+    (states.LOCATION, states.LOCATION_SENT): get_nearby,
+    (states.WATCH_PRICE, states.TEXT): get_watch_price,
+    (states.ANY, states.HISTORY): next_history_page,
+    (states.ANY, states.MORE): show_more,
+    (states.ANY, states.UNWATCH): remove_watch,
+    (states.ANY, states.CURRENCY): set_currency,
+})
+
+
+def use_shared_cache(path: str) -> None:
+    """
+    Функция подключения кэша, общего для всех процессов БОТа на сервере (shared_cache.SharedCache).
+
+    Кэши поиска городов (cities.search_cache) и страниц гостиниц (pages_cache модулей lowprice, highprice и
+    bestdeal) заменяются на общий кэш, поэтому результат API запроса одного процесса используют все процессы.
+
+    :param path: - путь к файлу общего кэша
+    :type path: str
+    """
+
+    import shared_cache
+    import lowprice
+    import highprice
+    import bestdeal
+    storage = shared_cache.SharedCache(path)
+    cities.search_cache = storage.view('cities', cities.SEARCH_TTL)
+    for module in (lowprice, highprice, bestdeal):
+        module.pages_cache = storage.view(module.__name__, module.PAGES_TTL)
+
+
+def create_bot(bot_token: str, api_key: str, history_db: str = history.HISTORY_DB,
+               cities_file: str = cities.CITIES_FILE, watch_db: str = watch.WATCH_DB,
+               cache_file: str = '', admin_ids: Iterable[int] = (),
+               slow_search: float = profiling.SLOW_SEARCH) -> telebot.TeleBot:
+    """
+    Фабрика БОТа.
+
+    Записывает настройки (config.configure), создает объект БОТа, хранилище истории поиска и регистрирует
+    обработчики сообщений (порядок регистрации важен: срабатывает первый подходящий обработчик).
+    Частота сообщений и нажатий кнопок каждого пользователя ограничивается (throttled), inline-запросы не
+    ограничиваются (их частоту снижает cities.Debouncer).
+    Заранее известные города (cities_file) загружаются в префиксный индекс в фоновом потоке, чтобы не задерживать
+    запуск БОТа. Запускается фоновая проверка цен по подпискам (первая проверка - через watch.FIRST_CHECK_DELAY сек.).
+    При нескольких процессах БОТа цены проверяет только один из них (блокировка файла рядом с базой подписок).
+    Если указан файл общего кэша (cache_file), то кэши API запросов общие для всех процессов БОТа (use_shared_cache).
+    Поиски дольше slow_search сек. сохраняются с разбивкой по этапам (profiling.slow_searches) для команды /slow.
+    Сетевых запросов функция не выполняет, запуск БОТа - в модуле run.py.
+
+    :param bot_token: - токен Телеграм-БОТа
+    :param api_key: - API-ключ сайта "hotels4.p.rapidapi.com"
+    :param history_db: - путь к файлу базы данных истории поиска
+    :param cities_file: - путь к файлу заранее известных городов
+    :param watch_db: - путь к файлу базы данных подписок на снижение цен
+    :param cache_file: - путь к файлу общего кэша процессов (если не указан, то у каждого процесса свой кэш)
+    :param admin_ids: - ID администраторов БОТа (команды /profile и /slow)
+    :param slow_search: - время поиска, начиная с которого сохраняется его разбивка по этапам, сек.
+    :type bot_token: str
+    :type api_key: str
+    :type history_db: str
+    :type cities_file: str
+    :type watch_db: str
+    :type cache_file: str
+    :type admin_ids: Iterable[int]
+    :type slow_search: float
+    :rtype: telebot.TeleBot
+    """
+
+    global bot, history_store, city_debouncer, watch_list, watch_scheduler
+    config.configure(bot_token, api_key, admin_ids)
+    profiling.slow_searches.threshold = slow_search
+    if cache_file:
+        use_shared_cache(cache_file)
+    bot = telebot.TeleBot(bot_token, num_threads=admission.WORKER_THREADS)
+    history_store = history.HistoryStore(history_db)
+    city_debouncer = cities.Debouncer(cities.DEBOUNCE_DELAY)
+    watch_list = watch.WatchList(watch_db)
+    if watch_scheduler is not None:
+        watch_scheduler.stop()
+    watch_scheduler = watch.WatchScheduler(watch_list, watch.AlertSender(bot.send_message),
+                                           lock_path=f'{watch_db}.lock')
+    watch_scheduler.start()
+    threading.Thread(target=cities.city_index.load, args=(cities_file,), name='cities-load', daemon=True).start()
+
+    bot.message_handler(commands=['history'])(throttled(show_history))
+    bot.message_handler(commands=['help', 'start', 'hello_world', 'lowprice', 'highprice', 'bestdeal',
+                                  'compare', 'calendar', 'nearby', 'watch', 'currency'])(throttled(start_message))
+    bot.message_handler(commands=['profile', 'slow'])(throttled(admin_command))
+    bot.message_handler(content_types=['text'])(throttled(get_text_messages))
+    bot.message_handler(content_types=['location'])(throttled(get_location_messages))
+    bot.inline_handler(func=lambda query: True)(inline_city)
+    bot.callback_query_handler(func=lambda call: True)(throttled(query_handler))
+    return bot
+
+
+if __name__ == "__main__":
+    import run
+    run.main(create_bot)
@@ -0,0 +1,117 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List
+
+import requests
+import telebot
+
+from cache import TTLCache
+import config
+
+MAX_PHOTOS = 10  # максимальное количество фотографий в одной медиа-группе Телеграм
+PHOTOS_TTL = 24 * 3600  # время жизни списка фотографий гостиницы в кэше, сек.
+MAX_WORKERS = 8  # максимальное количество одновременных API запросов
+
+photos_cache = TTLCache(ttl=PHOTOS_TTL, max_size=4096)  # кэш в виде (ID гостиницы: список ссылок на фотографии)
+file_id_cache = TTLCache(ttl=30 * 24 * 3600, max_size=65536)  # кэш в виде (ссылка на фото: file_id Телеграм)
+
+
+def get_photos(hotel_id: int, count: int = MAX_PHOTOS) -> List[str]:
+    """
+    Функция получения списка ссылок на фотографии гостиницы.
+
+    Сначала ищет список фотографий в кэше (photos_cache). Если его там нет, то отправляет API запрос на хост
+    "hotels4.p.rapidapi.com" и сохраняет полученный список в кэш. В кэш сохраняется список максимальной длины
+    (MAX_PHOTOS), поэтому повторный запрос с другим количеством фотографий не приводит к новому API запросу.
+    При ошибке получения данных возвращается пустой список (и он не кэшируется).
+
+    :param hotel_id: - значение ID гостиницы
+    :param count: - значение количества выводимых фотографий
+    :type hotel_id: int
+    :type count: int
+    :rtype: List[str]
+    """
+
+    urls = photos_cache.get(hotel_id)
+    if urls is None:
+        url = "https://hotels4.p.rapidapi.com/properties/get-hotel-photos"
+        querystring = {"id": hotel_id}
+        headers = {
+            'x-rapidapi-key': config.API_KEY,
+            'x-rapidapi-host': "hotels4.p.rapidapi.com"
+        }
+        try:
+            response = requests.request("GET", url, headers=headers, params=querystring, timeout=10)
+            data = json.loads(response.text)
+            urls = [elem['baseUrl'].replace('{size}', 'z') for elem in data['hotelImages'][:MAX_PHOTOS]]
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+            return []
+        photos_cache.set(hotel_id, urls)
+
+    return urls[:count]
+
+
+def get_photos_dict(hotel_ids: Iterable[int], count: int = MAX_PHOTOS) -> Dict[int, List[str]]:
+    """
+    Функция одновременного получения фотографий для всех найденных гостиниц.
+
+    API запросы для разных гостиниц выполняются параллельно (в пуле из MAX_WORKERS потоков), поэтому общее время
+    получения фотографий близко к времени самого долгого запроса, а не к их сумме.
+
+    :param hotel_ids: - список ID гостиниц
+    :param count: - значение количества выводимых фотографий
+    :rtype: Dict[int, List[str]] - словарь в виде (ID гостиницы: список ссылок на фотографии)
+    """
+
+    hotel_ids = list(dict.fromkeys(hotel_ids))  # убираем повторы, сохраняя порядок
+    if not hotel_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(hotel_ids))) as executor:
+        results = executor.map(lambda hotel_id: get_photos(hotel_id, count), hotel_ids)
+        return dict(zip(hotel_ids, results))
+
+
+def send_photos(bot: Any, chat_id: int, urls: List[str], caption: str = '') -> bool:
+    """
+    Функция отправки фотографий гостиницы в виде медиа-группы.
+
+    Если фотография уже отправлялась ранее, то вместо ссылки используется сохраненный file_id Телеграм (file_id_cache),
+    поэтому повторная отправка не требует повторной загрузки фотографии серверами Телеграм.
+    После отправки, для каждой фотографии сохраняется её file_id.
+    Если Телеграм не принял фотографии (н-р: ссылка недоступна или file_id устарел), то их file_id удаляются из кэша,
+    а вместо фотографий выводится сообщение об этом, чтобы вывод остальных гостиниц продолжился.
+
+    :param bot: - объект БОТа
+    :param chat_id: - ID чата
+    :param urls: - список ссылок на фотографии
+    :param caption: - подпись к первой фотографии
+    :type chat_id: int
+    :type urls: List[str]
+    :type caption: str
+    :rtype: bool - True, если фотографии отправлены
+    """
+
+    urls = urls[:MAX_PHOTOS]
+    if not urls:
+        return False
+    try:
+        if len(urls) == 1:  # медиа-группа должна содержать от 2 до 10 элементов
+            sent_messages = [bot.send_photo(chat_id, file_id_cache.get(urls[0], urls[0]), caption=caption)]
+        else:
+            media = []
+            for index, url in enumerate(urls):
+                photo = file_id_cache.get(url, url)
+                media.append(telebot.types.InputMediaPhoto(photo, caption=caption if index == 0 else None))
+            sent_messages = bot.send_media_group(chat_id, media)
+    except telebot.apihelper.ApiException as error_photos:
+        print('send_photos error: ', error_photos)
+        for url in urls:
+            file_id_cache.delete(url)
+        bot.send_message(chat_id, f"{caption}: фотографии сейчас недоступны." if caption else
+                         'Фотографии сейчас недоступны.')
+        return False
+
+    for url, sent_message in zip(urls, sent_messages or []):
+        if sent_message.photo:
+            file_id_cache.set(url, sent_message.photo[-1].file_id)
+    return True
@@ -0,0 +1,124 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import admission
+import currency
+import dates
+import lowprice
+from cache import TTLCache
+
+MAX_WORKERS = 4  # максимальное количество одновременных API запросов календаря (общее для всех пользователей)
+CALENDAR_TTL = 6 * 3600  # время жизни минимальной цены на дату в кэше, сек.
+
+calendar_cache = TTLCache(ttl=CALENDAR_TTL, max_size=16384)  # кэш в виде ((ID города, дата): минимальная цена)
+quota = threading.BoundedSemaphore(MAX_WORKERS)  # ограничение одновременных API запросов всех календарей
+
+
+def get_day_price(destination_id: str, check_in: datetime.date) -> Optional[float]:
+    """
+    Функция получения минимальной цены гостиницы в городе на одну ночь с указанной даты.
+
+    Сначала ищет цену в кэше (calendar_cache). Если её там нет, то получает самую дешевую гостиницу
+    (lowprice.get_hotels_dict), но не более MAX_WORKERS одновременных запросов для всех пользователей (quota).
+    При ошибке получения данных возвращается None (и он не кэшируется).
+
+    :param destination_id: - ID города
+    :param check_in: - дата заезда
+    :type destination_id: str
+    :type check_in: datetime.date
+    :rtype: Optional[float] - минимальная цена (float("inf"), если цена неизвестна)
+    """
+
+    key = (str(destination_id), check_in.isoformat())
+    price = calendar_cache.get(key)
+    if price is not None:
+        return price
+
+    check_in_text, check_out_text = dates.get_stay_dates(check_in)
+    with quota:
+        admission.checkpoint()
+        try:
+            hotels_dict = lowprice.get_hotels_dict(destination_id, 1, check_in=check_in_text,
+                                                   check_out=check_out_text)
+        except Exception as error_calendar:
+            print('get_day_price error: ', error_calendar)
+            return None
+
+    price = min((hotel['price'] for hotel in hotels_dict.values()), default=float('inf'))
+    calendar_cache.set(key, price)
+    return price
+
+
+def get_price_calendar(destination_id: str, first_day: datetime.date,
+                       days: int) -> Dict[datetime.date, Optional[float]]:
+    """
+    Функция получения календаря минимальных цен.
+
+    Цены на разные даты запрашиваются одновременно (не более MAX_WORKERS одновременных запросов).
+
+    :param destination_id: - ID города
+    :param first_day: - первая дата календаря
+    :param days: - количество дней (не более dates.MAX_CALENDAR_DAYS)
+    :type destination_id: str
+    :type first_day: datetime.date
+    :type days: int
+    :rtype: Dict[datetime.date, Optional[float]] - словарь в виде (дата заезда: минимальная цена)
+    """
+
+    days_list = [first_day + datetime.timedelta(days=day) for day in range(min(days, dates.MAX_CALENDAR_DAYS))]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        prices = executor.map(admission.bind(lambda day: get_day_price(destination_id, day)), days_list)
+        return dict(zip(days_list, prices))
+
+
+def parse_window(text: str) -> Tuple[datetime.date, int]:
+    """
+    Функция получения первой даты и количества дней календаря из сообщения пользователя (н-р: 25.12.2026 14).
+
+    Если дата не указана, то календарь начинается с сегодняшней даты.
+    При ошибке возникает исключение ValueError с сообщением для пользователя.
+
+    :param text: - сообщение пользователя
+    :type text: str
+    :rtype: Tuple[datetime.date, int] - (первая дата, количество дней)
+    """
+
+    parts = str(text).split()
+    if len(parts) == 1 and parts[0].isdigit():
+        first_day, days = datetime.date.today(), int(parts[0])
+    elif len(parts) == 2 and parts[1].isdigit():
+        first_day, days = dates.parse_date(parts[0]), int(parts[1])
+    else:
+        raise ValueError('Введите первую дату и количество дней (н-р: 25.12.2026 14) '
+                         'или только количество дней, начиная с сегодняшней даты (н-р: 14).')
+    if not 1 <= days <= dates.MAX_CALENDAR_DAYS:
+        raise ValueError(f'Количество дней должно быть от 1 до {dates.MAX_CALENDAR_DAYS}.')
+    return first_day, days
+
+
+def format_calendar(calendar: Dict[datetime.date, Optional[float]], code: str = currency.BASE_CURRENCY) -> str:
+    """
+    Функция форматирования календаря цен для вывода пользователю (самые дешевые даты отмечаются звездочкой).
+
+    :param calendar: - словарь в виде (дата заезда: минимальная цена в базовой валюте)
+    :param code: - код валюты вывода цен
+    :rtype: str
+    """
+
+    known = [price for price in calendar.values() if price is not None and price != float('inf')]
+    cheapest = min(known, default=None)
+    lines = [f'Минимальная цена за ночь, {currency.CURRENCIES[code]}:']
+    for day, price in calendar.items():
+        line = f"{day.strftime('%d.%m')} ({dates.WEEKDAYS[day.weekday()]}): "
+        if price is None:
+            line += 'сбой получения данных'
+        elif price == float('inf'):
+            line += 'нет предложений'
+        else:
+            line += f"{currency.from_base(price, code):.0f}" + (' *' if price == cheapest else '')
+        lines.append(line)
+    if cheapest is not None:
+        lines.append(f"* - самые дешевые даты ({currency.format_price(cheapest, code)})")
+    return '\n'.join(lines)
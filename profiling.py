@@ -0,0 +1,313 @@
+import collections
+import contextlib
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Optional
+
+SAMPLE_INTERVAL = 0.01  # интервал между снимками стеков потоков при профилировании, сек.
+PROFILE_SECONDS = 10  # продолжительность профилирования по умолчанию, сек.
+MAX_PROFILE_SECONDS = 120  # максимальная продолжительность профилирования, сек.
+PROFILE_DIR = 'profiles'  # папка файлов профилирования
+SLOW_SEARCH = 5.0  # время поиска, начиная с которого сохраняется разбивка поиска по этапам, сек.
+MAX_TRACES = 50  # количество хранимых разбивок медленных поисков (старые вытесняются новыми)
+
+
+class SamplingProfiler:
+    """
+    Класс профилировщика, периодически снимающего стеки всех потоков БОТа (sampling profiler).
+
+    Профилировщик работает в отдельном потоке и не замедляет остальные потоки в промежутках между снимками
+    (раз в SAMPLE_INTERVAL сек.). Одинаковые стеки подсчитываются, а результат записывается в файл в формате
+    "свернутых стеков" (collapsed stacks: "поток;функция;функция количество"), который принимают flamegraph.pl,
+    speedscope и другие средства построения flame graph.
+    Одновременно выполняется не более одного профилирования.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, directory: str = PROFILE_DIR) -> None:
+        """
+        :param interval: - интервал между снимками стеков, сек.
+        :param directory: - папка файлов профилирования
+        :type interval: float
+        :type directory: str
+        """
+        self.__interval = interval
+        self.__directory = directory
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.__labels = {}  # подписи функций в виде (код функции: "функция (файл:строка)")
+
+    def is_running(self) -> bool:
+        """ Функция проверки, что профилирование выполняется. """
+        return self.__running
+
+    def start(self, seconds: float = PROFILE_SECONDS, on_done: Optional[Callable[[str], Any]] = None) -> bool:
+        """
+        Функция запуска профилирования в фоновом потоке.
+
+        :param seconds: - продолжительность профилирования, сек. (не более MAX_PROFILE_SECONDS)
+        :param on_done: - функция, вызываемая с путем к файлу профилирования после его записи
+        :type seconds: float
+        :type on_done: Optional[Callable]
+        :rtype: bool - False, если профилирование уже выполняется
+        """
+        with self.__lock:
+            if self.__running:
+                return False
+            self.__running = True
+        seconds = min(max(seconds, self.__interval), MAX_PROFILE_SECONDS)
+        threading.Thread(target=self.__run, args=(seconds, on_done), name='profiler', daemon=True).start()
+        return True
+
+    def __run(self, seconds: float, on_done: Optional[Callable[[str], Any]]) -> None:
+        """ Функция фонового потока: снимает стеки seconds сек., записывает файл и вызывает on_done. """
+        try:
+            stacks = self.__sample(seconds)
+            path = self.__write(stacks)
+            print('Профилирование записано в файл: ', path)
+            if on_done is not None:
+                on_done(path)
+        except Exception as error_profile:
+            print('SamplingProfiler error: ', error_profile)
+        finally:
+            self.__running = False
+
+    def __sample(self, seconds: float) -> collections.Counter:
+        """ Функция снятия стеков: возвращает счетчик в виде (свернутый стек: количество снимков). """
+        own_id = threading.get_ident()
+        stacks = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self.__label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(re.sub(r'[\d-]+$', '', names.get(thread_id, 'thread')) or 'thread')
+                stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.__interval)
+        return stacks
+
+    def __label(self, code: Any) -> str:
+        """ Функция получения подписи функции в стеке (подписи кэшируются, чтобы снимок занимал меньше времени). """
+        label = self.__labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+            self.__labels[code] = label
+        return label
+
+    def __write(self, stacks: collections.Counter) -> str:
+        """ Функция записи свернутых стеков в файл (имя файла - дата и время записи). """
+        os.makedirs(self.__directory, exist_ok=True)
+        path = os.path.join(self.__directory, time.strftime('profile-%Y%m%d-%H%M%S.folded'))
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+
+class SearchTrace:
+    """
+    Класс разбивки одного поиска по этапам (очередь, запрос и разбор каждой страницы, вывод).
+
+    Разбивка относится к одному обработчику сообщения, поэтому этапы предыдущих шагов диалога (н-р: поиск города
+    в get_city) в неё не входят и записываются в разбивку своего обработчика.
+    """
+
+    def __init__(self, name: str, user_id: Optional[int] = None) -> None:
+        """
+        :param name: - название поиска (н-р: функция обработки сообщения)
+        :param user_id: - ID пользователя
+        """
+        self.name = name
+        self.user_id = user_id
+        self.started = time.time()
+        self.total = 0.0  # общее время поиска, сек.
+        self.phases = []  # этапы в виде [(название, начало от начала поиска, продолжительность), ...]
+        self.__start = time.perf_counter()
+
+    def add_phase(self, name: str, started: float, finished: float) -> None:
+        """
+        Функция записи этапа (этапы могут записываться из разных потоков одного поиска).
+
+        :param name: - название этапа
+        :param started: - время начала этапа (time.perf_counter)
+        :param finished: - время окончания этапа (time.perf_counter)
+        """
+        self.phases.append((name, started - self.__start, finished - started))
+
+    def finish(self) -> None:
+        """ Функция окончания поиска (записывает общее время). """
+        self.total = time.perf_counter() - self.__start
+
+    def format(self) -> str:
+        """ Функция форматирования разбивки для вывода (этапы - в порядке начала). """
+        started = time.strftime('%d-%m-%Y %H:%M:%S', time.localtime(self.started))
+        lines = [f"{self.name} - {self.total:.2f} сек. ({started}, пользователь: {self.user_id})"]
+        for name, offset, duration in sorted(self.phases, key=lambda phase_item: phase_item[1]):
+            lines.append(f"  +{offset:.2f} {name}: {duration:.2f} сек.")
+        return '\n'.join(lines)
+
+
+class TraceBuffer:
+    """
+    Класс хранилища разбивок медленных поисков (кольцевой буфер).
+
+    Сохраняются только поиски, которые длились не менее threshold сек. Хранится не более max_traces последних
+    разбивок, поэтому память не растет, сколько бы медленных поисков ни было.
+    """
+
+    def __init__(self, threshold: float = SLOW_SEARCH, max_traces: int = MAX_TRACES) -> None:
+        """
+        :param threshold: - время поиска, начиная с которого разбивка сохраняется, сек.
+        :param max_traces: - количество хранимых разбивок
+        :type threshold: float
+        :type max_traces: int
+        """
+        self.threshold = threshold
+        self.__traces = collections.deque(maxlen=max_traces)
+
+    def add(self, trace_item: SearchTrace) -> bool:
+        """
+        Функция сохранения разбивки поиска (если поиск медленный).
+
+        :param trace_item: - разбивка поиска
+        :type trace_item: SearchTrace
+        :rtype: bool - True, если разбивка сохранена
+        """
+        if trace_item.total < self.threshold:
+            return False
+        self.__traces.append(trace_item)
+        return True
+
+    def get_traces(self, limit: int = MAX_TRACES) -> List[SearchTrace]:
+        """
+        Геттер для получения последних разбивок (от новых к старым).
+
+        :param limit: - максимальное количество разбивок
+        :type limit: int
+        :rtype: List[SearchTrace]
+        """
+        return list(reversed(self.__traces))[:limit]
+
+    def __len__(self) -> int:
+        return len(self.__traces)
+
+
+profiler = SamplingProfiler()
+slow_searches = TraceBuffer()
+_local = threading.local()  # разбивка поиска, выполняемого текущим потоком
+
+
+@contextlib.contextmanager
+def trace(name: str, user_id: Optional[int] = None) -> Iterator[SearchTrace]:
+    """
+    Контекстный менеджер разбивки поиска по этапам.
+
+    Этапы (phase) записываются в разбивку поиска текущего потока. После окончания поиска разбивка сохраняется
+    в slow_searches, если поиск был медленным. Вложенный поиск (н-р: обработчик вызывает другой обработчик)
+    записывается в разбивку внешнего поиска.
+
+    :param name: - название поиска
+    :param user_id: - ID пользователя
+    :type name: str
+    :type user_id: Optional[int]
+    """
+
+    current = getattr(_local, 'trace', None)
+    if current is not None:
+        yield current
+        return
+    current = SearchTrace(name, user_id)
+    _local.trace = current
+    try:
+        yield current
+    finally:
+        _local.trace = None
+        current.finish()
+        slow_searches.add(current)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Контекстный менеджер этапа поиска (н-р: запрос страницы). Если поиск в текущем потоке не выполняется,
+    то ничего не записывается.
+
+    :param name: - название этапа
+    :type name: str
+    """
+
+    current = getattr(_local, 'trace', None)
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_phase(name, started, time.perf_counter())
+
+
+def bind(func: Callable) -> Callable:
+    """
+    Функция передачи разбивки поиска текущего потока в функцию, выполняемую другим потоком (н-р: ThreadPoolExecutor),
+    чтобы этапы, выполняемые одновременно, тоже попали в разбивку поиска.
+
+    :param func: - функция, выполняемая другим потоком
+    :type func: Callable
+    :rtype: Callable
+    """
+
+    current = getattr(_local, 'trace', None)
+    if current is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapped_func(*args, **kwargs) -> Any:
+        _local.trace = current
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.trace = None
+
+    return wrapped_func
+
+
+def traced(func: Callable) -> Callable:
+    """
+    Декоратор разбивки по этапам обработчика поиска (первый аргумент - сообщение или нажатие кнопки).
+
+    :param func: - обработчик поиска
+    :return: wrapped_func
+    """
+
+    @functools.wraps(func)
+    def wrapped_func(message: Any, *args, **kwargs) -> Any:
+        with trace(func.__name__, message.from_user.id):
+            return func(message, *args, **kwargs)
+
+    return wrapped_func
+
+
+def install_signal_handler(seconds: float = PROFILE_SECONDS) -> bool:
+    """
+    Функция подключения профилирования по сигналу SIGUSR1 (kill -USR1 <pid>), файл записывается в PROFILE_DIR.
+    Должна вызываться из главного потока. В Windows сигнала нет.
+
+    :param seconds: - продолжительность профилирования, сек.
+    :type seconds: float
+    :rtype: bool - True, если обработчик сигнала подключен
+    """
+
+    import signal
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda *args: profiler.start(seconds))
+    return True
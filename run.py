@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import hmac
+import http.server
+import logging
+import secrets
+import time
+from typing import Any, Callable, List, Optional
+from urllib.parse import urlparse
+
+import telebot
+
+import config
+import profiling
+
+RETRY_DELAY = 0.5  # задержка перед первым перезапуском БОТа после сбоя, сек.
+MAX_RETRY_DELAY = 30  # максимальная задержка перед перезапуском БОТа (при повторяющихся сбоях), сек.
+STABLE_TIME = 60  # время работы без сбоев, после которого задержка перезапуска сбрасывается до RETRY_DELAY, сек.
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'  # заголовок с секретом webhook в запросах серверов Телеграм
+
+
+def start_polling(bot: telebot.TeleBot) -> None:
+    """
+    Функция запуска БОТа в режиме опроса серверов Телеграм (polling).
+
+    При сбое (н-р: обрыве соединения) БОТ перезапускается через RETRY_DELAY сек. Если сбои повторяются, то задержка
+    удваивается (но не более MAX_RETRY_DELAY), а после STABLE_TIME сек. работы без сбоев снова сбрасывается.
+
+    :param bot: - объект БОТа
+    :type bot: telebot.TeleBot
+    """
+
+    delay = RETRY_DELAY
+    while True:
+        started = time.monotonic()
+        try:
+            bot.polling(none_stop=True, interval=0)
+            return
+        except KeyboardInterrupt:
+            return
+        except Exception as error_main:
+            print('Exception: ', error_main.__class__, error_main)
+            logging.exception("Переподключение к серверам")
+        if time.monotonic() - started > STABLE_TIME:
+            delay = RETRY_DELAY
+        print(f"Переподключение к серверам через {delay} сек.")
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_RETRY_DELAY)
+
+
+def start_webhook(bot: telebot.TeleBot, url: str, host: str = '0.0.0.0', port: int = 8443,
+                  secret: str = '') -> None:
+    """
+    Функция запуска БОТа в режиме webhook.
+
+    Регистрирует адрес webhook на серверах Телеграм и запускает HTTP сервер, который передает полученные
+    обновления БОТу. Адрес должен быть доступен серверам Телеграм по HTTPS (н-р: через nginx).
+    Адрес регистрируется с секретом (secret_token), который серверы Телеграм присылают в заголовке SECRET_HEADER.
+    Запросы без этого секрета отклоняются, поэтому подделать обновление (н-р: от имени администратора) нельзя.
+    Если секрет не указан, то он генерируется случайно (при нескольких процессах за балансировщиком секрет
+    нужно указать явно и одинаковый для всех процессов).
+
+    :param bot: - объект БОТа
+    :param url: - внешний адрес webhook (н-р: https://example.com/bot)
+    :param host: - адрес, на котором HTTP сервер принимает запросы
+    :param port: - порт, на котором HTTP сервер принимает запросы
+    :param secret: - секрет webhook (1-256 символов: A-Z, a-z, 0-9, "_" и "-")
+    :type bot: telebot.TeleBot
+    :type url: str
+    :type host: str
+    :type port: int
+    :type secret: str
+    """
+
+    path = urlparse(url).path or '/'
+    secret = secret or secrets.token_urlsafe(32)
+
+    class WebhookHandler(http.server.BaseHTTPRequestHandler):
+        """ Класс обработки запросов серверов Телеграм. """
+
+        def do_POST(self) -> None:
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), secret):
+                self.send_response(403)
+                self.end_headers()
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            update = telebot.types.Update.de_json(self.rfile.read(length).decode('utf-8'))
+            self.send_response(200)
+            self.end_headers()
+            bot.process_new_updates([update])
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    bot.remove_webhook()
+    # TeleBot.set_webhook этой версии pyTelegramBotAPI не передает secret_token, поэтому - прямой запрос к API
+    telebot.apihelper._make_request(bot.token, 'setWebhook', params={'url': url, 'secret_token': secret})
+    server = http.server.ThreadingHTTPServer((host, port), WebhookHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def main(create_bot: Optional[Callable] = None, argv: Optional[List[str]] = None) -> None:
+    """
+    Точка входа: чтение настроек из settings.py, создание БОТа (main.create_bot) и его запуск.
+    Сигнал SIGUSR1 запускает профилирование БОТа (profiling.install_signal_handler).
+
+    :param create_bot: - фабрика БОТа (по умолчанию main.create_bot)
+    :param argv: - аргументы командной строки
+    """
+
+    parser = argparse.ArgumentParser(description='EasyTravelBot')
+    parser.add_argument('--webhook', metavar='URL', help='запуск в режиме webhook с указанным внешним адресом')
+    parser.add_argument('--host', default='0.0.0.0', help='адрес HTTP сервера webhook')
+    parser.add_argument('--port', type=int, default=8443, help='порт HTTP сервера webhook')
+    parser.add_argument('--webhook-secret', metavar='SECRET', default='',
+                        help='секрет webhook (по умолчанию - случайный; для нескольких процессов - одинаковый)')
+    parser.add_argument('--shared-cache', metavar='FILE',
+                        help='файл кэша, общего для всех процессов БОТа на сервере (н-р: /dev/shm/easytravelbot.cache)')
+    parser.add_argument('--slow-search', metavar='SECONDS', type=float, default=profiling.SLOW_SEARCH,
+                        help='время поиска, начиная с которого сохраняется его разбивка по этапам (команда /slow)')
+    args = parser.parse_args(argv)
+
+    try:
+        settings = config.load_settings()
+    except ImportError:
+        exit('В файле settings.py нужно создать BOT_TOKEN и API_KEY пример в settings.default.txt')
+
+    if args.shared_cache:
+        settings['cache_file'] = args.shared_cache
+    settings['slow_search'] = args.slow_search
+    if create_bot is None:
+        from main import create_bot
+    bot = create_bot(**settings)
+    profiling.install_signal_handler()
+    if args.webhook:
+        start_webhook(bot, args.webhook, args.host, args.port, args.webhook_secret)
+    else:
+        start_polling(bot)
+
+
+if __name__ == "__main__":
+    main()
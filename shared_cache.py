@@ -0,0 +1,232 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Any, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SLOTS = 2048  # количество ячеек кэша
+SLOT_SIZE = 16384  # размер ячейки (заголовок + ключ и значение), байт
+WAYS = 8  # количество ячеек в группе (запись с ключом может находиться только в ячейках своей группы)
+READ_RETRIES = 3  # количество повторов чтения ячейки, которую в этот момент перезаписывает другой процесс
+
+MAGIC = b'ETBCACHE'
+FILE_HEADER = struct.Struct('<8sIII')  # метка файла, версия формата, количество ячеек, размер ячейки
+FILE_HEADER_SIZE = 64
+FORMAT_VERSION = 1
+SLOT_HEADER = struct.Struct('<IQdI')  # версия ячейки, хэш ключа, время устаревания, длина данных
+VERSION = struct.Struct('<I')
+
+
+class SharedCache:
+    """
+    Класс кэша, общего для всех процессов БОТа на одном сервере (без внешнего сервера кэша).
+
+    Записи хранятся в файле, отображенном в память (mmap), в ячейках фиксированного размера. Ячейка записи
+    определяется хэшем ключа: ключ может находиться только в одной группе из WAYS ячеек, поэтому поиск проверяет
+    не более WAYS ячеек.
+    Чтение не использует блокировок: у каждой ячейки есть версия, нечетная во время записи. Если версия ячейки
+    изменилась за время чтения, то чтение повторяется (не более READ_RETRIES раз), иначе - запись не найдена.
+    Запись блокирует файл (общая блокировка всех процессов). Если в группе нет свободной или устаревшей ячейки,
+    то вытесняется запись, которая устареет раньше остальных (единая политика вытеснения для всех процессов).
+    Записи, не помещающиеся в ячейку, не кэшируются.
+    """
+
+    def __init__(self, path: str, slots: int = SLOTS, slot_size: int = SLOT_SIZE) -> None:
+        """
+        :param path: - путь к файлу кэша (создается, если его нет)
+        :param slots: - количество ячеек (кратно WAYS)
+        :param slot_size: - размер ячейки, байт
+        :type path: str
+        :type slots: int
+        :type slot_size: int
+        """
+        self.__slots = slots - slots % WAYS
+        self.__slot_size = slot_size
+        self.__groups = self.__slots // WAYS
+        self.__size = FILE_HEADER_SIZE + self.__slots * slot_size
+        self.__thread_lock = threading.Lock()  # блокировка файла (flock) не различает потоки одного процесса
+        self.__file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+        with self.__lock():
+            self.__file.seek(0)
+            header = self.__file.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size or \
+                    FILE_HEADER.unpack(header) != (MAGIC, FORMAT_VERSION, self.__slots, slot_size):
+                self.__file.truncate(0)  # новый файл или файл другого формата
+                self.__file.truncate(self.__size)
+                self.__file.seek(0)
+                self.__file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, self.__slots, slot_size))
+                self.__file.flush()
+        self.__memory = mmap.mmap(self.__file.fileno(), self.__size)
+
+    def view(self, namespace: str, ttl: float) -> 'SharedCacheView':
+        """
+        Функция получения кэша для отдельного вида записей (н-р: поиск городов) с общим хранилищем.
+
+        :param namespace: - название вида записей (входит в ключ)
+        :param ttl: - время жизни записей, сек.
+        :type namespace: str
+        :type ttl: float
+        :rtype: SharedCacheView
+        """
+        return SharedCacheView(self, namespace, ttl)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Геттер для получения записи из кэша (без блокировок).
+
+        :param key: - ключ записи (должен одинаково преобразовываться в строку во всех процессах)
+        :param default: - значение по умолчанию
+        :rtype [Any]
+        """
+        key_text = repr(key)
+        key_hash = self.__hash(key_text)
+        for offset in self.__group(key_hash):
+            for _ in range(READ_RETRIES):
+                version, slot_hash, expires, length = SLOT_HEADER.unpack_from(self.__memory, offset)
+                if version % 2:
+                    continue
+                if slot_hash != key_hash or expires < time.time():
+                    break
+                data = self.__memory[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length]
+                if VERSION.unpack_from(self.__memory, offset)[0] != version:
+                    continue
+                stored_key, value = pickle.loads(data)
+                if stored_key == key_text:
+                    return value
+                break
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        """
+        Сеттер для записи в кэш.
+
+        :param key: - ключ записи
+        :param value: - значение (должно сериализоваться модулем pickle)
+        :param ttl: - время жизни записи, сек.
+        :type ttl: float
+        """
+        key_text = repr(key)
+        data = pickle.dumps((key_text, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if SLOT_HEADER.size + len(data) > self.__slot_size:
+            return
+        key_hash = self.__hash(key_text)
+        with self.__lock():
+            now = time.time()
+            target, target_expires = None, None
+            for offset in self.__group(key_hash):
+                _, slot_hash, expires, _ = SLOT_HEADER.unpack_from(self.__memory, offset)
+                if slot_hash == key_hash:
+                    target = offset
+                    break
+                if expires < now:
+                    expires = float('-inf')  # свободная или устаревшая ячейка
+                if target is None or expires < target_expires:
+                    target, target_expires = offset, expires
+            self.__write(target, key_hash, now + ttl, data)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Функция удаления записи из кэша.
+
+        :param key: - ключ записи
+        """
+        key_hash = self.__hash(repr(key))
+        with self.__lock():
+            for offset in self.__group(key_hash):
+                if SLOT_HEADER.unpack_from(self.__memory, offset)[1] == key_hash:
+                    self.__write(offset, 0, 0.0, b'')
+
+    def clear(self) -> None:
+        """ Функция очистки кэша (для всех процессов). """
+        with self.__lock():
+            for offset in range(FILE_HEADER_SIZE, self.__size, self.__slot_size):
+                self.__write(offset, 0, 0.0, b'')
+
+    def __len__(self) -> int:
+        now = time.time()
+        return sum(1 for offset in range(FILE_HEADER_SIZE, self.__size, self.__slot_size)
+                   if SLOT_HEADER.unpack_from(self.__memory, offset)[2] >= now)
+
+    def __write(self, offset: int, key_hash: int, expires: float, data: bytes) -> None:
+        """ Функция записи ячейки: версия нечетная на время записи, поэтому читатели пропускают ячейку. """
+        version = VERSION.unpack_from(self.__memory, offset)[0]
+        VERSION.pack_into(self.__memory, offset, (version + 1) & 0xFFFFFFFF)
+        self.__memory[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(data)] = data
+        SLOT_HEADER.pack_into(self.__memory, offset, (version + 1) & 0xFFFFFFFF, key_hash, expires, len(data))
+        VERSION.pack_into(self.__memory, offset, (version + 2) & 0xFFFFFFFF)
+
+    def __group(self, key_hash: int) -> range:
+        """ Функция получения смещений ячеек группы, в которой может находиться ключ. """
+        start = FILE_HEADER_SIZE + (key_hash % self.__groups) * WAYS * self.__slot_size
+        return range(start, start + WAYS * self.__slot_size, self.__slot_size)
+
+    @staticmethod
+    def __hash(key_text: str) -> int:
+        """ Функция получения хэша ключа, одинакового во всех процессах (встроенный hash() - разный). """
+        return int.from_bytes(hashlib.blake2b(key_text.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+    def __lock(self) -> '_FileLock':
+        """ Функция получения блокировки записи (для потоков процесса и для всех процессов). """
+        return _FileLock(self.__file, self.__thread_lock)
+
+
+class SharedCacheView:
+    """ Класс кэша отдельного вида записей в общем кэше процессов (интерфейс совпадает с cache.TTLCache). """
+
+    def __init__(self, storage: SharedCache, namespace: str, ttl: float) -> None:
+        """
+        :param storage: - общий кэш процессов
+        :param namespace: - название вида записей
+        :param ttl: - время жизни записей, сек.
+        """
+        self.__storage = storage
+        self.__namespace = namespace
+        self.__ttl = ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Геттер для получения записи из кэша. """
+        return self.__storage.get((self.__namespace, key), default)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """ Сеттер для записи в кэш. """
+        self.__storage.set((self.__namespace, key), value, self.__ttl)
+
+    def delete(self, key: Hashable) -> None:
+        """ Функция удаления записи из кэша. """
+        self.__storage.delete((self.__namespace, key))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+
+class _FileLock:
+    """ Класс блокировки файла кэша (контекстный менеджер). """
+
+    def __init__(self, file: Any, thread_lock: threading.Lock) -> None:
+        self.__file = file
+        self.__thread_lock = thread_lock
+
+    def __enter__(self) -> None:
+        self.__thread_lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX)
+        else:
+            self.__file.seek(0)
+            msvcrt.locking(self.__file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def __exit__(self, *args: Any) -> None:
+        if fcntl is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.__file.seek(0)
+            msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.__thread_lock.release()
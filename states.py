@@ -0,0 +1,104 @@
+from typing import Callable, Dict, Optional, Tuple
+
+# Состояния диалога с пользователем (хранятся в переменных пользователя, поэтому должны быть строками).
+START = 'start'  # ожидание команды
+CITY = 'city'  # ожидание названия города
+CITY_CHOICE = 'city_choice'  # ожидание выбора города из списка (кнопкой)
+DATES = 'dates'  # ожидание дат проживания
+CALENDAR = 'calendar'  # ожидание периода календаря цен (режим поиска самых дешевых дат)
+MIN_PRICE = 'min_price'  # ожидание минимальной стоимости гостиницы
+MAX_PRICE = 'max_price'  # ожидание максимальной стоимости гостиницы
+PRICE_CONFLICT = 'price_conflict'  # ожидание выбора действия при максимальной стоимости меньше минимальной
+MIN_DISTANCE = 'min_distance'  # ожидание минимальной дистанции от центра города
+MAX_DISTANCE = 'max_distance'  # ожидание максимальной дистанции от центра города
+DISTANCE_CONFLICT = 'distance_conflict'  # ожидание выбора действия при максимальной дистанции меньше минимальной
+LIMIT = 'limit'  # ожидание количества выводимых гостиниц
+PHOTOS = 'photos'  # ожидание количества выводимых фотографий
+COMPARE = 'compare'  # ожидание списка сравниваемых городов
+LOCATION = 'location'  # ожидание местоположения пользователя (режим поиска гостиниц рядом)
+WATCH_PRICE = 'watch_price'  # ожидание цены подписки на снижение цен
+
+ANY = '*'  # любое состояние (для событий, обрабатываемых независимо от состояния диалога)
+
+# События диалога.
+TEXT = 't'  # получено текстовое сообщение
+LOCATION_SENT = 'l'  # получено местоположение пользователя
+CITY_SELECTED = 'c'  # нажата кнопка выбора города
+REPLACE = 'r'  # нажата кнопка "Поменять местами максимальное и минимальное значение"
+REWRITE = 'w'  # нажата кнопка "Попробовать ввести все значения заново"
+HISTORY = 'h'  # нажата кнопка "Далее" в истории поиска
+MORE = 'm'  # нажата кнопка "Показать ещё" под результатами поиска
+UNWATCH = 'u'  # нажата кнопка "Удалить" подписки на снижение цен
+CURRENCY = 'v'  # нажата кнопка выбора валюты цен
+
+CALLBACK_VERSION = '1'  # версия формата callback_data (меняется при несовместимом изменении формата)
+CALLBACK_MAX_LENGTH = 64  # максимальная длина callback_data в Телеграм, байт
+
+
+class StateMachine:
+    """
+    Класс табличного конечного автомата диалога.
+
+    Хранит таблицу переходов в виде словаря ((состояние, событие): обработчик), поэтому поиск обработчика
+    осуществляется за O(1). Сами состояния хранятся в переменных пользователя в виде строк.
+    """
+
+    def __init__(self, table: Dict[Tuple[str, str], Callable]) -> None:
+        """
+        :param table: - таблица переходов в виде ((состояние, событие): обработчик)
+        :type table: Dict[Tuple[str, str], Callable]
+        """
+        self.__table = dict(table)
+
+    def get_handler(self, state: str, event: str) -> Optional[Callable]:
+        """
+        Геттер для получения обработчика события в текущем состоянии.
+
+        Если для текущего состояния обработчик не задан, то ищется обработчик события для любого состояния (ANY).
+
+        :param state: - текущее состояние
+        :param event: - событие
+        :type state: str
+        :type event: str
+        :rtype: Optional[Callable]
+        """
+        handler = self.__table.get((state, event), None)
+        if handler is None:
+            handler = self.__table.get((ANY, event), None)
+        return handler
+
+
+def encode_callback(event: str, arg: str = '') -> str:
+    """
+    Функция кодирования callback_data кнопки в виде "версия:событие:аргумент".
+
+    :param event: - событие
+    :param arg: - аргумент события (н-р: ID города)
+    :type event: str
+    :type arg: str
+    :rtype: str
+    """
+
+    data = f"{CALLBACK_VERSION}:{event}:{arg}"
+    if len(data.encode('utf-8')) > CALLBACK_MAX_LENGTH:
+        raise ValueError(f"callback_data длиннее {CALLBACK_MAX_LENGTH} байт: {data}")
+    return data
+
+
+def decode_callback(data: str) -> Tuple[Optional[str], str]:
+    """
+    Функция декодирования callback_data кнопки.
+
+    Если callback_data имеет другую версию или формат (н-р: кнопка осталась от предыдущей версии БОТа), то
+    возвращается пустое событие (None).
+
+    :param data: - callback_data кнопки
+    :type data: str
+    :rtype: Tuple[Optional[str], str] - (событие, аргумент)
+    """
+
+    version, _, rest = str(data).partition(':')
+    if version != CALLBACK_VERSION or not rest:
+        return None, ''
+    event, _, arg = rest.partition(':')
+    return event, arg
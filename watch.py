@@ -0,0 +1,373 @@
+import bisect
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import currency
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+WATCH_DB = 'watch.sqlite3'  # файл базы данных подписок на снижение цен
+CHECK_INTERVAL = 3600  # периодичность проверки цен (один запрос на каждый город за цикл), сек.
+FIRST_CHECK_DELAY = 60  # задержка первой проверки цен после запуска БОТа, сек.
+WATCH_LIMIT = 25  # количество самых дешевых гостиниц города, проверяемых за цикл
+MAX_WATCHES = 5  # максимальное количество подписок одного пользователя
+MAX_ALERT_HOTELS = 5  # максимальное количество гостиниц в одном уведомлении
+SEND_RATE = 20  # максимальное количество отправляемых уведомлений в секунду (для всех пользователей)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watch (
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    destination_id TEXT NOT NULL,
+    city TEXT NOT NULL,
+    max_price REAL NOT NULL,
+    created INTEGER NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'RUB',
+    PRIMARY KEY (user_id, destination_id)
+);
+CREATE TABLE IF NOT EXISTS watch_notified (
+    user_id INTEGER NOT NULL,
+    destination_id TEXT NOT NULL,
+    hotel_id TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (user_id, destination_id, hotel_id)
+);
+"""
+
+
+class WatchList:
+    """
+    Класс для хранения подписок пользователей на снижение цен гостиниц.
+
+    Подписки хранятся в базе данных SQLite, а в памяти - в индексе по городам в виде
+    (ID города: (ID пользователя: подписка)), поэтому все подписчики города получаются за O(1).
+    У каждого пользователя не более одной подписки на город (повторная подписка меняет цену).
+    Базу могут менять несколько процессов БОТа, поэтому подписки пользователя читаются из базы, а индекс
+    перечитывается перед каждым циклом проверки цен (reload). Отправленные цены (notified) тоже хранятся в базе,
+    поэтому после перезапуска или смены процесса, проверяющего цены, уведомления о тех же ценах не повторяются.
+    """
+
+    def __init__(self, path: str = WATCH_DB) -> None:
+        """
+        :param path: - путь к файлу базы данных
+        :type path: str
+        """
+        self.__connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.__connection.execute('PRAGMA table_info(watch)')]
+        if 'currency' not in columns:  # база данных, созданная до появления выбора валюты
+            with self.__connection:
+                self.__connection.execute("ALTER TABLE watch ADD COLUMN currency TEXT NOT NULL DEFAULT 'RUB'")
+        self.__lock = threading.Lock()
+        self.__index = {}  # индекс подписок в виде (ID города: (ID пользователя: подписка))
+        self.reload()
+
+    def reload(self) -> None:
+        """
+        Функция перечитывания индекса подписок и отправленных цен из базы (н-р: подписки, добавленные или удаленные
+        другим процессом).
+        """
+        with self.__lock:
+            rows = self.__connection.execute('SELECT user_id, chat_id, destination_id, city, max_price, currency '
+                                             'FROM watch').fetchall()
+            index = {}
+            for row in rows:
+                watch = self.__make(*row)
+                index.setdefault(watch['destination_id'], {})[watch['user_id']] = watch
+            for user_id, destination_id, hotel_id, price in self.__connection.execute(
+                    'SELECT user_id, destination_id, hotel_id, price FROM watch_notified'):
+                watch = index.get(destination_id, {}).get(user_id)
+                if watch is not None:
+                    watch['notified'][hotel_id] = price
+            self.__index = index
+
+    def save_notified(self, watches: List[Dict]) -> None:
+        """
+        Функция записи отправленных цен подписок в базу.
+
+        Цены записываются, только если подписка не изменилась с момента чтения (н-р: другим процессом), иначе
+        отправленные по старой цене уведомления не мешают уведомлениям по новой.
+
+        :param watches: - подписки (см. check_destination)
+        :type watches: List[Dict]
+        """
+        rows = [(watch['user_id'], watch['destination_id'], hotel_id, price, watch['user_id'], watch['destination_id'],
+                 watch['max_price'], watch['currency'])
+                for watch in watches for hotel_id, price in watch['notified'].items()]
+        with self.__lock, self.__connection:
+            self.__connection.executemany('INSERT OR REPLACE INTO watch_notified (user_id, destination_id, hotel_id, '
+                                          'price) SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM watch '
+                                          'WHERE user_id = ? AND destination_id = ? AND max_price = ? AND '
+                                          'currency = ?)', rows)
+
+    def add(self, user_id: int, chat_id: int, destination_id: str, city: str, max_price: float,
+            code: str = currency.BASE_CURRENCY) -> None:
+        """
+        Функция добавления (изменения) подписки (уведомления по новой подписке отправляются заново).
+
+        Если у пользователя уже MAX_WATCHES подписок на другие города, то возникает исключение ValueError
+        с сообщением для пользователя.
+
+        :param user_id: - ID пользователя
+        :param chat_id: - ID чата для уведомлений
+        :param destination_id: - ID города
+        :param city: - название города
+        :param max_price: - цена, ниже которой нужно уведомить пользователя (в базовой валюте)
+        :param code: - код валюты уведомлений
+        :type user_id: int
+        :type chat_id: int
+        :type destination_id: str
+        :type city: str
+        :type max_price: float
+        :type code: str
+        """
+        destination_id = str(destination_id)
+        with self.__lock:
+            watches = self.get_user_watches(user_id)
+            if len(watches) >= MAX_WATCHES and all(watch['destination_id'] != destination_id for watch in watches):
+                raise ValueError(f'Можно следить не более чем за {MAX_WATCHES} городами. '
+                                 f'Удалите одну из подписок командой /watch.')
+            with self.__connection:
+                self.__connection.execute('INSERT OR REPLACE INTO watch (user_id, chat_id, destination_id, city, '
+                                          'max_price, created, currency) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                          (user_id, chat_id, destination_id, city, max_price, int(time.time()),
+                                           code))
+                self.__connection.execute('DELETE FROM watch_notified WHERE user_id = ? AND destination_id = ?',
+                                          (user_id, destination_id))
+            self.__index.setdefault(destination_id, {})[user_id] = self.__make(user_id, chat_id, destination_id,
+                                                                               city, max_price, code)
+
+    def remove(self, user_id: int, destination_id: str) -> bool:
+        """
+        Функция удаления подписки.
+
+        :param user_id: - ID пользователя
+        :param destination_id: - ID города
+        :type user_id: int
+        :type destination_id: str
+        :rtype: bool - True, если подписка была
+        """
+        destination_id = str(destination_id)
+        with self.__lock:
+            with self.__connection:
+                self.__connection.execute('DELETE FROM watch WHERE user_id = ? AND destination_id = ?',
+                                          (user_id, destination_id))
+                self.__connection.execute('DELETE FROM watch_notified WHERE user_id = ? AND destination_id = ?',
+                                          (user_id, destination_id))
+            subscribers = self.__index.get(destination_id, {})
+            found = subscribers.pop(user_id, None) is not None
+            if not subscribers:
+                self.__index.pop(destination_id, None)
+            return found
+
+    def get_user_watches(self, user_id: int) -> List[Dict]:
+        """
+        Геттер для получения подписок пользователя (из базы, с учетом изменений в других процессах).
+
+        :param user_id: - ID пользователя
+        :type user_id: int
+        :rtype: List[Dict]
+        """
+        rows = self.__connection.execute('SELECT user_id, chat_id, destination_id, city, max_price, currency '
+                                         'FROM watch WHERE user_id = ?', (user_id,)).fetchall()
+        return [self.__make(*row) for row in rows]
+
+    def get_destinations(self) -> List[str]:
+        """ Геттер для получения ID городов, на которые есть подписки. """
+        return list(self.__index)
+
+    def get_subscribers(self, destination_id: str) -> List[Dict]:
+        """
+        Геттер для получения подписок всех пользователей на город.
+
+        :param destination_id: - ID города
+        :type destination_id: str
+        :rtype: List[Dict]
+        """
+        return list(self.__index.get(str(destination_id), {}).values())
+
+    @staticmethod
+    def __make(user_id: int, chat_id: int, destination_id: str, city: str, max_price: float, code: str) -> Dict:
+        """ Функция создания подписки (notified - уже отправленные цены в виде (ID гостиницы строкой: цена)). """
+        return {'user_id': user_id, 'chat_id': chat_id, 'destination_id': str(destination_id), 'city': city,
+                'max_price': max_price, 'currency': code, 'notified': {}}
+
+
+def check_destination(hotels_dict: Dict, subscribers: List[Dict]) -> List[Tuple[int, str]]:
+    """
+    Функция проверки всех подписчиков города по одному общему результату поиска.
+
+    Гостиницы сортируются по цене один раз, после чего для каждого подписчика подходящие гостиницы (дешевле его цены)
+    находятся бинарным поиском. Уведомление о гостинице отправляется повторно, только если её цена снизилась
+    еще больше с прошлого уведомления. В уведомление попадают не более MAX_ALERT_HOTELS самых дешевых гостиниц,
+    и отправленными считаются только они (об остальных будет сообщено в следующих циклах). Цены сравниваются
+    в базовой валюте, а в уведомлении переводятся в валюту подписчика.
+
+    :param hotels_dict: - словарь гостиниц в виде (название: {'id': ID, 'text': информация, 'price': цена})
+    :param subscribers: - подписки на город
+    :type hotels_dict: Dict
+    :type subscribers: List[Dict]
+    :rtype: List[Tuple[int, str]] - список уведомлений в виде [(ID чата, текст), ...]
+    """
+
+    hotels = sorted((hotel['price'], name, hotel['id']) for name, hotel in hotels_dict.items())
+    prices = [price for price, _, _ in hotels]
+    alerts = []
+    for watch in subscribers:
+        code = currency.get_currency(watch['currency'])
+        found = [(price, name, str(hotel_id)) for price, name, hotel_id
+                 in hotels[:bisect.bisect_left(prices, watch['max_price'])]
+                 if price < watch['notified'].get(str(hotel_id), float('inf'))][:MAX_ALERT_HOTELS]
+        for price, _, hotel_id in found:
+            watch['notified'][hotel_id] = price
+        if found:
+            alerts.append((watch['chat_id'], f"Цены в городе {watch['city']} ниже "
+                                             f"{currency.format_price(watch['max_price'], code)}:\n" +
+                           '\n'.join(f"{name}: {currency.format_price(price, code)}" for price, name, _ in found)))
+    return alerts
+
+
+class AlertSender:
+    """
+    Класс отправки уведомлений с ограничением скорости.
+
+    Уведомления ставятся в очередь и отправляются отдельным фоновым потоком не чаще SEND_RATE в секунду,
+    поэтому массовая рассылка не превышает ограничений Телеграм.
+    """
+
+    def __init__(self, send: Callable[[int, str], Any], rate: float = SEND_RATE) -> None:
+        """
+        :param send: - функция отправки сообщения (н-р: bot.send_message)
+        :param rate: - максимальное количество сообщений в секунду
+        :type send: Callable
+        :type rate: float
+        """
+        self.__send = send
+        self.__interval = 1 / rate
+        self.__queue = queue.Queue()
+        threading.Thread(target=self.__send_loop, name='watch-sender', daemon=True).start()
+
+    def put(self, chat_id: int, text: str) -> None:
+        """ Функция постановки уведомления в очередь (не блокирует вызывающий поток). """
+        self.__queue.put((chat_id, text))
+
+    def flush(self) -> None:
+        """ Функция ожидает отправки всех уведомлений из очереди. """
+        self.__queue.join()
+
+    def __send_loop(self) -> None:
+        """ Функция фонового потока отправки: между сообщениями выдерживается интервал 1 / rate сек. """
+        next_time = time.monotonic()
+        while True:
+            chat_id, text = self.__queue.get()
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.__send(chat_id, text)
+            except Exception as error_send:
+                print('AlertSender error: ', error_send)
+            next_time = max(next_time, time.monotonic() - self.__interval) + self.__interval
+            self.__queue.task_done()
+
+
+class WatchScheduler:
+    """
+    Класс фоновой проверки цен по подпискам.
+
+    Каждые CHECK_INTERVAL сек. для каждого города с подписками один раз запрашиваются самые дешевые гостиницы
+    (lowprice.get_hotels_dict), после чего по этому общему результату проверяются все подписчики города
+    (check_destination). Поэтому количество API запросов зависит от количества городов, а не пользователей.
+    Если указан файл блокировки (lock_path), то при нескольких процессах БОТа цены проверяет только процесс,
+    захвативший блокировку (остальные пробуют захватить её каждый цикл, н-р: после остановки этого процесса),
+    поэтому уведомления не дублируются.
+    """
+
+    def __init__(self, watch_list: WatchList, sender: AlertSender, interval: float = CHECK_INTERVAL,
+                 first_delay: float = FIRST_CHECK_DELAY, lock_path: str = '') -> None:
+        """
+        :param watch_list: - подписки пользователей
+        :param sender: - отправка уведомлений
+        :param interval: - периодичность проверки цен, сек.
+        :param first_delay: - задержка первой проверки, сек.
+        :param lock_path: - путь к файлу блокировки (общему для процессов БОТа, н-р: рядом с базой подписок)
+        """
+        self.__watch_list = watch_list
+        self.__sender = sender
+        self.__interval = interval
+        self.__first_delay = first_delay
+        self.__lock_path = lock_path
+        self.__lock_file = None  # открытый файл захваченной блокировки (держится до завершения процесса)
+        self.__stop = threading.Event()
+        self.__thread = None  # type: Optional[threading.Thread]
+
+    def start(self) -> None:
+        """ Функция запуска фонового потока проверки цен. """
+        self.__thread = threading.Thread(target=self.__loop, name='watch-scheduler', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """ Функция остановки фонового потока проверки цен (после текущего цикла блокировка освобождается). """
+        self.__stop.set()
+
+    def run_cycle(self) -> int:
+        """
+        Функция одного цикла проверки цен (подписки перечитываются из базы).
+
+        :rtype: int - количество отправленных в очередь уведомлений
+        """
+        import lowprice
+        count = 0
+        self.__watch_list.reload()
+        for destination_id in self.__watch_list.get_destinations():
+            try:
+                hotels_dict = lowprice.get_hotels_dict(destination_id, WATCH_LIMIT)
+            except Exception as error_watch:
+                print('WatchScheduler error: ', error_watch)
+                continue
+            subscribers = self.__watch_list.get_subscribers(destination_id)
+            for chat_id, text in check_destination(hotels_dict, subscribers):
+                self.__sender.put(chat_id, text)
+                count += 1
+            self.__watch_list.save_notified(subscribers)
+        return count
+
+    def is_leader(self) -> bool:
+        """
+        Функция проверки (захвата) блокировки проверки цен без ожидания.
+
+        :rtype: bool - True, если цены проверяет этот процесс
+        """
+        if not self.__lock_path or self.__lock_file is not None:
+            return True
+        lock_file = open(self.__lock_path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:  # блокировку держит другой процесс
+            lock_file.close()
+            return False
+        self.__lock_file = lock_file
+        return True
+
+    def __loop(self) -> None:
+        """ Функция фонового потока: первый цикл через first_delay сек., далее - каждые interval сек. """
+        delay = self.__first_delay
+        while not self.__stop.wait(delay):
+            started = time.monotonic()
+            if self.is_leader():
+                self.run_cycle()
+            delay = max(0.0, self.__interval - (time.monotonic() - started))
+        if self.__lock_file is not None:  # после остановки цены может проверять другой процесс (планировщик)
+            self.__lock_file.close()
+            self.__lock_file = None